@@ -26,8 +26,9 @@ async def download_file(download_request: DownloadRequest):
     filename = os.path.basename(download_request.file_path)
     
     if download_request.metadata:
-        soulseek_manager.library_service.download_metadata[download_id] = download_request.metadata
-        soulseek_manager.library_service.download_metadata[filename] = download_request.metadata
+        soulseek_manager.library_service.add_download_metadata(
+            download_request.username, download_request.file_path, download_request.metadata
+        )
     
     soulseek_manager.active_downloads[download_id] = {
         'id': download_id,
@@ -142,6 +143,7 @@ async def cancel_download(download_id: str):
     
     if download_id in soulseek_manager.active_downloads:
         del soulseek_manager.active_downloads[download_id]
+    soulseek_manager.library_service.remove_download_metadata(username, file_path)
     
     try:
         for transfer in list(core.downloads.transfers.values()):
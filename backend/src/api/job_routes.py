@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+from core.job_manager import JobManager
+
+router = APIRouter()
+
+job_manager: JobManager
+
+@router.get("/jobs")
+async def list_jobs(type: Optional[str] = None):
+    """List running and recently finished background jobs, newest first."""
+    return [job.to_dict() for job in reversed(job_manager.list(type))]
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the status, progress and result of a background job."""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
+
+@router.post("/jobs/{job_id}/cancel", status_code=202)
+async def cancel_job(job_id: str):
+    """Request cancellation of a queued or running job."""
+    job = job_manager.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
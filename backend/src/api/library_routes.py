@@ -1,28 +1,121 @@
-from fastapi import APIRouter, HTTPException, Query as FastQuery, Request, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Query as FastQuery, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from models.library_models import AddFileRequest, ShowInExplorerRequest, StoreMetadataRequest
 from core.library_service import LibraryService
-from core.song_processor import SongProcessor
-from core.forensic_visualizer import analyze_audio_for_visualization, create_visual_report
+from core.library_scanner import LibraryScanner
+from core.song_processor import SongProcessor, PRIORITY_INTERACTIVE
+from core.job_manager import JobManager, Job
+from core.forensic_service import ForensicTaskError
+from core.forensic_cache import content_fingerprint
+from core.audio_forensics import ANALYZER_VERSION
+from core.forensic_report import spectrogram_tile
 from pynicotine.config import config
+from typing import List, Optional
+from urllib.parse import quote
+from utils.concurrency import run_blocking
 import os
+import re
+import json
 import shutil
-import glob
 import logging
 import subprocess
 import sys
-from tinydb import Query as TinyDBQuery
 
 router = APIRouter()
 
+_FINGERPRINT = re.compile(r'^\d+-[0-9a-f]{32}$')
+
 library_service: LibraryService
+library_scanner: LibraryScanner
 song_processor: SongProcessor
+job_manager: JobManager
 
 
 @router.get("/library/songs")
-async def get_library_songs():
-    """Get all songs from the library."""
-    return library_service.get_all_songs()
+async def get_library_songs(
+    request: Request,
+    limit: Optional[int] = FastQuery(None, ge=1, le=5000),
+    after: Optional[str] = None,
+    sort: str = 'path',
+    order: str = 'asc',
+    fields: Optional[str] = None,
+):
+    """
+    Get songs from the library.
+
+    Without `limit` the whole library is returned as a JSON array. With `limit`
+    a page object `{items, next, version}` is returned; pass `next` back as
+    `after` for the following page. `fields` is a comma separated list of
+    (dotted) fields to return, e.g. `path,metadata.title,metadata.artist`.
+    The library version is sent as ETag so unchanged libraries answer 304.
+    """
+    version = await run_blocking('library_io', library_service.get_library_version)
+    etag = f'"library-{version}"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+
+    if order not in ('asc', 'desc'):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'.")
+
+    field_list = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+    try:
+        body = await run_blocking('library_io', _songs_body, version, limit, after, sort, order == 'desc', field_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=body, media_type='application/json', headers=headers)
+
+def _songs_body(version: int, limit: Optional[int], after: Optional[str], sort: str,
+                descending: bool, fields: Optional[List[str]]) -> str:
+    items, next_cursor = library_service.get_songs_page(
+        limit=limit, after=after, sort=sort, descending=descending, fields=fields
+    )
+    # Items are already JSON encoded by the store, so the body is assembled
+    # directly instead of being decoded and re-serialized.
+    body = '[' + ','.join(items) + ']'
+    if limit:
+        body = f'{{"items":{body},"next":{json.dumps(next_cursor)},"version":{version}}}'
+    return body
+
+@router.get("/library/changes")
+async def get_library_changes(since: int = FastQuery(0, ge=0), limit: int = FastQuery(500, ge=1, le=5000)):
+    """
+    Get library changes after the `since` sequence number. When `reset` is
+    true the requested range was already pruned and the client must reload.
+    """
+    return await run_blocking('library_io', library_service.changes.read, since, limit)
+
+@router.get("/library/changes/stream")
+async def stream_library_changes(request: Request, since: Optional[int] = FastQuery(None, ge=0)):
+    """
+    Stream library changes as Server-Sent Events. Clients resume with `since`
+    or the Last-Event-ID header; without either only new changes are sent.
+    """
+    last_event_id = request.headers.get('last-event-id')
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    if since is None:
+        since = await run_blocking('library_io', library_service.changes.latest_seq)
+
+    async def event_stream():
+        seq = since
+        yield f"retry: 3000\nevent: ready\ndata: {json.dumps({'latest': seq})}\n\n"
+        while not await request.is_disconnected():
+            batch = await run_blocking('library_io', library_service.changes.read, seq)
+            if batch['reset']:
+                # Also when `seq` is past the end of a recreated log, which would never be reached.
+                seq = batch['latest']
+                yield f"id: {seq}\nevent: reset\ndata: {json.dumps({'latest': seq})}\n\n"
+                continue
+            for change in batch['changes']:
+                seq = change['seq']
+                yield f"id: {seq}\nevent: {change['kind']}\ndata: {json.dumps(change)}\n\n"
+            if batch['changes']:
+                continue
+            if not await library_service.changes.wait(seq, timeout=15):
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(event_stream(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache'})
 
 @router.get("/library/lyrics")
 async def get_lyrics(filePath: str = FastQuery(...)):
@@ -33,8 +126,7 @@ async def get_lyrics(filePath: str = FastQuery(...)):
     music_directory = config.sections["transfers"]["downloaddir"]
     absolute_path = os.path.join(music_directory, filePath)
     
-    Lyrics = TinyDBQuery()
-    lyrics_data = library_service.lyrics_table.get(Lyrics.file_path == absolute_path)
+    lyrics_data = await run_blocking('library_io', library_service.get_lyrics, absolute_path)
     
     if not lyrics_data:
         logging.info(f"Lyrics not found in local cache for: {absolute_path}")
@@ -43,31 +135,48 @@ async def get_lyrics(filePath: str = FastQuery(...)):
     logging.info(f"Found lyrics in local cache for: {absolute_path}")
     return lyrics_data
 
-@router.post("/library/sync")
-async def sync_library():
-    """Synchronize the library with the file system."""
-    db_files = {song['path'] for song in library_service.get_all_songs()}
-    
+def run_library_sync(job: Job):
+    """Scans the music directory and processes new and changed files."""
     music_directory = config.sections["transfers"]["downloaddir"]
-    fs_files = set()
-    for ext in {'.mp3', '.wav', '.flac', '.m4a', '.aac', '.ogg', '.wma', '.opus'}:
-        fs_files.update(glob.glob(os.path.join(music_directory, f"**/*{ext}"), recursive=True))
+    job.update(message="Scanning music directory")
+    plan = library_scanner.sync(music_directory)
+    job.check_cancelled()
 
-    new_files = fs_files - db_files
-    deleted_files = db_files - fs_files
+    job.update(done=0, total=len(plan.to_process), message="Processing new and changed files")
+    batch = song_processor.pipeline.run(plan.to_process, job=job)
+    return {
+        "new": plan.new,
+        "changed": plan.changed,
+        "deleted": len(plan.removed),
+        "processed": batch.processed,
+        "failed": batch.failed,
+        "cancelled": batch.cancelled,
+        "skipped": batch.skipped,
+    }
 
-    for file_path in deleted_files:
-        library_service.remove_song(file_path)
+def start_library_sync():
+    """Starts a library sync, or returns the one that is already running."""
+    return job_manager.submit('library_sync', run_library_sync, key='library')
 
-    for file_path in new_files:
-        song_processor.process_new_song(file_path)
+@router.post("/library/sync", status_code=202)
+async def sync_library():
+    """
+    Starts synchronizing the library with the file system. If a sync is
+    already running, its job is returned instead of starting another scan.
+    """
+    job, created = start_library_sync()
+    message = "Sync started" if created else "Sync already in progress"
+    return {"message": message, "job": job.to_dict(), "status_url": f"/jobs/{job.id}"}
 
-    return {"message": "Sync completed", "new": len(new_files), "deleted": len(deleted_files)}
+@router.get("/library/ingest/progress")
+async def get_ingest_progress():
+    """Get per-stage counters of the song ingestion pipeline."""
+    return song_processor.pipeline.progress()
 
 @router.get("/library/songs/pending-review")
 async def get_songs_pending_review():
     """Get all songs that are pending metadata review."""
-    songs = library_service.get_all_songs()
+    songs = await run_blocking('library_io', library_service.get_all_songs)
     pending_review = [
         song for song in songs
         if song.get('metadata', {}).get('metadata_status') == 'pending_review'
@@ -75,10 +184,12 @@ async def get_songs_pending_review():
     return pending_review
 
 
-@router.post("/library/songs/process")
+@router.post("/library/songs/process", status_code=202)
 async def process_library_song(request: ShowInExplorerRequest):
     """
-    Triggers the full metadata processing logic for a single song file already in the library.
+    Queues the full metadata processing logic for a single song file already in
+    the library. The job runs ahead of any bulk sync work; poll the returned
+    status URL for its progress.
     """
     file_path = request.filePath
     logging.info(f"On-demand processing triggered for: {file_path}")
@@ -86,47 +197,66 @@ async def process_library_song(request: ShowInExplorerRequest):
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found at the specified path.")
 
-    try:
+    def process(job: Job):
         # This will re-run the entire metadata fallback and enrichment process
-        song_processor.process_new_song(file_path)
-        return {"message": f"Successfully triggered processing for {os.path.basename(file_path)}"}
-    except Exception as e:
-        # Log the full error for debugging
-        logging.error(f"Error during on-demand processing for {file_path}: {e}")
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during song processing.")
+        job.update(done=0, total=1)
+        processing_job = song_processor.enqueue(file_path, PRIORITY_INTERACTIVE)
+        while not processing_job.wait(0.5):
+            if job.cancelled:
+                song_processor.pipeline.cancel(processing_job)
+        job.update(done=1)
+        if processing_job.status == 'failed':
+            raise RuntimeError(processing_job.error)
+        return processing_job.to_dict()
 
-def run_forensic_analysis(file_path: str, output_path: str):
+    job, _ = job_manager.submit('song_process', process, key=file_path)
+    return {
+        "message": f"Successfully queued processing for {os.path.basename(file_path)}",
+        "job": job.to_dict(),
+        "status_url": f"/jobs/{job.id}",
+    }
+
+def open_report(report_path: str):
+    """Opens a report with the default image viewer."""
+    if sys.platform == "win32":
+        os.startfile(report_path)
+    elif sys.platform == "darwin":
+        subprocess.Popen(["open", report_path])
+    else:
+        subprocess.Popen(["xdg-open", report_path])
+
+def run_forensic_analysis(job: Job, file_path: str, temp_dir: str):
     """
-    A helper function to run the CPU-intensive analysis in the background.
+    Renders the report in a forensic worker process and opens it. Reports
+    are named after the audio's content fingerprint, so an existing report
+    is opened without rendering it again until the audio changes.
     """
-    try:
-        logging.info(f"Starting background forensic analysis for: {file_path}")
-        analysis_data, plot_data = analyze_audio_for_visualization(file_path)
-        
-        if not plot_data:
-            error_message = analysis_data if isinstance(analysis_data, str) else "Failed to analyze audio for visualization."
-            logging.error(f"Forensic analysis failed for {file_path}: {error_message}")
-            return
-
-        create_visual_report(analysis_data, plot_data, output_path)
+    fingerprint = content_fingerprint(file_path)
+    output_path = os.path.join(temp_dir, f"forensic_{fingerprint}_v{ANALYZER_VERSION}.png")
+    if not os.path.exists(output_path):
+        logging.info(f"Starting forensic analysis for: {file_path}")
+        job.update(done=0, total=1, message="Analyzing audio")
+        try:
+            song_processor.forensics.report(file_path, output_path, lambda: job.cancelled)
+        except ForensicTaskError as e:
+            job.check_cancelled()
+            logging.error(f"Forensic analysis failed for {file_path}: {e}")
+            raise RuntimeError(str(e))
         logging.info(f"Forensic report successfully generated at: {output_path}")
+        job.update(done=1, message=None)
+    else:
+        logging.info(f"Report already exists, opening: {output_path}")
 
-        # Open the file with the default viewer after generation
-        if sys.platform == "win32":
-            os.startfile(output_path)
-        elif sys.platform == "darwin":
-            subprocess.Popen(["open", output_path])
-        else:
-            subprocess.Popen(["xdg-open", output_path])
-            
-    except Exception as e:
-        logging.error(f"Error during background forensic report generation for {file_path}: {e}", exc_info=True)
+    open_report(output_path)
+    return {"report_path": output_path}
 
 
-@router.post("/library/songs/generate-forensics")
-async def generate_forensics_for_song(request: ShowInExplorerRequest, background_tasks: BackgroundTasks):
+@router.post("/library/songs/generate-forensics", status_code=202)
+async def generate_forensics_for_song(request: ShowInExplorerRequest):
     """
-    Triggers a background task to generate and open a forensic analysis image.
+    Starts a job that generates a forensic analysis image and opens it.
+    Poll the returned status URL for its progress; cancelling the job stops
+    the analysis.
     """
     relative_path = request.filePath
     music_directory = config.sections["transfers"]["downloaddir"]
@@ -140,23 +270,99 @@ async def generate_forensics_for_song(request: ShowInExplorerRequest, background
 
     temp_dir = os.path.join(library_service.data_path, "temp")
     os.makedirs(temp_dir, exist_ok=True)
-    
-    file_name = os.path.splitext(os.path.basename(file_path))[0]
-    output_filename = f"forensic_{file_name}.png"
-    output_path = os.path.join(temp_dir, output_filename)
 
-    # If the report already exists, just open it without regenerating
-    if os.path.exists(output_path):
-        logging.info(f"Report already exists, opening: {output_path}")
-        if sys.platform == "win32":
-            os.startfile(output_path)
-        elif sys.platform == "darwin":
-            subprocess.Popen(["open", output_path])
-        else:
-            subprocess.Popen(["xdg-open", output_path])
-        return {"message": "Forensic report already exists and is being opened."}
-
-    # Add the long-running task to the background
-    background_tasks.add_task(run_forensic_analysis, file_path, output_path)
-
-    return {"message": "Forensic generation has been started in the background."}
\ No newline at end of file
+    # A second request for the same file attaches to the running job.
+    job, created = job_manager.submit('forensics', lambda job: run_forensic_analysis(job, file_path, temp_dir), key=file_path)
+    return {
+        "message": "Forensic generation has been started in the background." if created else "Forensic generation already in progress.",
+        "job": job.to_dict(),
+        "status_url": f"/jobs/{job.id}",
+    }
+
+
+@router.get("/library/forensics/status")
+async def get_forensics_status():
+    """Get the forensic analysis workers, their queued and running tasks, and the verdict cache."""
+    return song_processor.forensics.status()
+
+
+def run_forensic_data_analysis(job: Job, file_path: str, report_url: str):
+    """Analyzes a file whose spectral analysis isn't stored yet, for the data report."""
+    job.update(done=0, total=1, message="Analyzing audio")
+    try:
+        evidence, spectrum = song_processor.forensics.spectrum(file_path, lambda: job.cancelled)
+    except ForensicTaskError:
+        job.check_cancelled()
+        raise
+    if spectrum is None:
+        raise RuntimeError("Failed to analyze audio.")
+    job.update(done=1, message=None)
+    return {"verdict": evidence['verdict'], "report_url": report_url}
+
+
+@router.get("/library/forensics/report")
+async def get_forensic_report(request: Request, filePath: str = FastQuery(...)):
+    """
+    Get the forensic report of a song as data for the frontend to draw: the
+    verdict and its evidence, the layout of a decimated spectrogram pyramid,
+    the peak-energy curve and a high-band stereo correlation summary.
+    Spectrogram tiles are fetched from `tile_url` as raw uint8 rows.
+
+    Reports are built from the analysis stored at ingestion and are keyed by
+    the audio's content fingerprint, which is sent as ETag. If the file was
+    never analyzed, a job is started instead and 202 returned with it; fetch
+    the report again once the job is done.
+    """
+    music_directory = config.sections["transfers"]["downloaddir"]
+    file_path = os.path.join(music_directory, filePath)
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="File not found.")
+
+    fingerprint = await run_blocking('forensics', content_fingerprint, file_path)
+    etag = f'"forensics-{fingerprint}-v{ANALYZER_VERSION}"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+
+    stored = await run_blocking('forensics', song_processor.forensics.stored_report, fingerprint)
+    if stored is None:
+        report_url = f"/library/forensics/report?filePath={quote(filePath)}"
+        job, _ = job_manager.submit(
+            'forensics', lambda job: run_forensic_data_analysis(job, file_path, report_url), key=f"data:{file_path}"
+        )
+        return JSONResponse(status_code=202, content={
+            "message": "The song is being analyzed.",
+            "job": job.to_dict(),
+            "status_url": f"/jobs/{job.id}",
+        })
+
+    report, _levels = stored
+    return JSONResponse(headers=headers, content={
+        "fingerprint": fingerprint,
+        "filename": os.path.basename(file_path),
+        **report,
+        "tile_url": f"/library/forensics/{fingerprint}/v{ANALYZER_VERSION}/spectrogram/{{level}}/{{tile}}",
+    })
+
+
+@router.get("/library/forensics/{fingerprint}/v{version}/spectrogram/{level}/{tile}")
+async def get_forensic_spectrogram_tile(fingerprint: str, version: int, level: int, tile: int, request: Request):
+    """
+    Serve one tile of a report's spectrogram pyramid as raw uint8 values, one
+    row per frequency band from the lowest up; X-Bins and X-Columns give its
+    shape. Tiles are addressed by content, so they are cacheable forever.
+    """
+    if not _FINGERPRINT.match(fingerprint) or version != ANALYZER_VERSION:
+        raise HTTPException(status_code=404, detail="Report not found.")
+
+    etag = f'"forensics-{fingerprint}-v{version}-{level}-{tile}"'
+    headers = {'Cache-Control': 'public, max-age=31536000, immutable', 'ETag': etag}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+
+    stored = await run_blocking('forensics', song_processor.forensics.stored_report, fingerprint)
+    data = spectrogram_tile(stored[1], level, tile) if stored else None
+    if data is None:
+        raise HTTPException(status_code=404, detail="Tile not found.")
+    headers.update({'X-Bins': str(data.shape[0]), 'X-Columns': str(data.shape[1])})
+    return Response(content=data.tobytes(), media_type='application/octet-stream', headers=headers)
@@ -3,6 +3,7 @@ from models.playlist_models import Playlist, CreatePlaylistRequest, UpdatePlayli
 from core.library_service import LibraryService
 from core.playlist_service import PlaylistService
 from typing import List
+from utils.concurrency import run_blocking
 import uuid
 from datetime import datetime
 
@@ -16,7 +17,9 @@ async def create_playlist(request: CreatePlaylistRequest):
     playlist_id = str(uuid.uuid4())
     now = datetime.utcnow().isoformat()
 
-    thumbnail_path = playlist_service.download_playlist_thumbnail(request.name, request.thumbnail)
+    thumbnail_path = await run_blocking(
+        'playlist_thumbnail', playlist_service.download_playlist_thumbnail, request.name, request.thumbnail
+    )
 
     playlist = Playlist(
         id=playlist_id,
@@ -46,7 +49,9 @@ async def update_playlist(playlist_id: str, request: UpdatePlaylistRequest):
     if 'thumbnail' in updates and updates['thumbnail']:
         playlist = library_service.get_playlist(playlist_id)
         if playlist:
-            thumbnail_path = playlist_service.download_playlist_thumbnail(playlist.name, updates['thumbnail'])
+            thumbnail_path = await run_blocking(
+                'playlist_thumbnail', playlist_service.download_playlist_thumbnail, playlist.name, updates['thumbnail']
+            )
             updates['thumbnail'] = thumbnail_path
 
     return library_service.update_playlist(playlist_id, updates)
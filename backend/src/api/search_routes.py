@@ -3,6 +3,7 @@ from core.search_service import search_service
 from models.search_models import SearchQuery, SearchResult
 from core.soulseek_manager import SoulseekManager
 from pynicotine.events import events
+from utils.concurrency import run_blocking
 
 router = APIRouter()
 
@@ -16,7 +17,7 @@ async def search(provider: str, q: str):
     if not q:
         raise HTTPException(status_code=400, detail="Query parameter 'q' is required.")
     
-    results = search_service.search(provider, q)
+    results = await search_service.search(provider, q)
     
     if "error" in results:
         raise HTTPException(status_code=500, detail=results["error"])
@@ -30,7 +31,10 @@ async def search_files(query: SearchQuery):
         raise HTTPException(status_code=503, detail="Not connected to Soulseek")
     
     try:
-        token, actual_query = soulseek_manager.perform_search_with_fallback(query.artist, query.song, query.query)
+        # The fallback waits a few seconds for first results, so it runs in a worker thread.
+        token, actual_query = await run_blocking(
+            'soulseek_search', soulseek_manager.perform_search_with_fallback, query.artist, query.song, query.query
+        )
         
         if token is None:
             return {"search_token": None, "actual_query": actual_query}
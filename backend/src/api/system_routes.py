@@ -1,24 +1,34 @@
 import json
 import logging
-from fastapi import APIRouter, HTTPException
+import re
+from fastapi import APIRouter, HTTPException, Request, Response
 from fastapi.responses import FileResponse
+from typing import Optional
 from models.library_models import ShowInExplorerRequest
 from models.system_models import RomanizeRequest, ConfigRequest
 from core.soulseek_manager import SoulseekManager
 from core.romanization_service import RomanizationService
+from core.http_client import http_client
+from core.cover_store import CoverStore, THUMBNAIL_SIZES
+from core.readiness import readiness
 from pynicotine.config import config
 from pynicotine.events import events
+from pynicotine.core import core
 import os
 import subprocess
 import sys
 import glob
+from utils.concurrency import run_blocking
 
 router = APIRouter()
 
 soulseek_manager: SoulseekManager
 romanization_service: RomanizationService
+cover_store: CoverStore
 data_path: str
 
+_COVER_DIGEST = re.compile(r'^[0-9a-f]{32}$')
+
 @router.get("/")
 async def root():
     """Root endpoint."""
@@ -26,8 +36,8 @@ async def root():
 
 @router.get("/health")
 async def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy", "soulseek_connected": soulseek_manager.logged_in}
+    """Health check endpoint, with the progress of the startup phases."""
+    return {"status": "healthy", "soulseek_connected": soulseek_manager.logged_in, **readiness.to_dict()}
 
 @router.get("/download-dir")
 async def get_download_dir():
@@ -79,14 +89,16 @@ async def show_in_explorer(request: ShowInExplorerRequest):
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail=f"File not found at: {file_path}")
     
-    try:
+    def reveal():
         if sys.platform == "win32":
             subprocess.run(["explorer", "/select,", os.path.normpath(file_path)], check=True)
         elif sys.platform == "darwin":
             subprocess.run(["open", "-R", os.path.normpath(file_path)], check=True)
         else:
             subprocess.run(["xdg-open", os.path.dirname(os.path.normpath(file_path))], check=True)
-        
+
+    try:
+        await run_blocking('system', reveal)
         return {"message": "File shown in explorer", "file_path": file_path}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred while opening the file explorer: {e}")
@@ -98,16 +110,19 @@ async def get_sharing_status():
         download_dir = config.sections["transfers"]["downloaddir"]
         shared_folders = config.sections["transfers"]["shared"]
         
-        file_count = 0
-        total_size = 0
-        
-        if os.path.exists(download_dir):
-            for ext in {'.mp3', '.wav', '.flac', '.m4a', '.aac', '.ogg', '.wma', '.opus'}:
-                pattern = os.path.join(download_dir, f"*{ext}")
-                for file_path in glob.glob(pattern):
-                    if os.path.isfile(file_path):
-                        file_count += 1
-                        total_size += os.path.getsize(file_path)
+        def count_shared_files():
+            file_count = 0
+            total_size = 0
+            if os.path.exists(download_dir):
+                for ext in {'.mp3', '.wav', '.flac', '.m4a', '.aac', '.ogg', '.wma', '.opus'}:
+                    pattern = os.path.join(download_dir, f"*{ext}")
+                    for file_path in glob.glob(pattern):
+                        if os.path.isfile(file_path):
+                            file_count += 1
+                            total_size += os.path.getsize(file_path)
+            return file_count, total_size
+
+        file_count, total_size = await run_blocking('system', count_shared_files)
         
         is_sharing_downloads = any(
             folder_path == download_dir for _, folder_path in shared_folders
@@ -133,7 +148,7 @@ async def rescan_shares():
     try:
         if hasattr(core, 'shares') and core.shares:
             events.emit_main_thread("shares-scanning")
-            core.shares.rescan_shares()
+            await run_blocking('system', core.shares.rescan_shares)
             return {"message": "Share rescan initiated"}
         else:
             return {"message": "Shares system not available"}
@@ -161,11 +176,16 @@ async def get_connection_status():
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to get connection status")
 
+@router.get("/network/metrics")
+async def get_network_metrics():
+    """Get per-host counters of outbound HTTP requests (requests, retries, errors, throttling)."""
+    return http_client.metrics()
+
 @router.post("/romanize")
 async def romanize_text(request: RomanizeRequest):
     """Romanize text using uroman."""
     try:
-        romanized_text = romanization_service.romanize(request.text)
+        romanized_text = await run_blocking('romanize', romanization_service.romanize, request.text)
         return {"romanized_text": romanized_text}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -181,6 +201,31 @@ async def get_cover_image(image_path: str):
     
     return FileResponse(file_path)
 
+@router.get("/covers/hash/{digest}")
+async def get_cover_by_hash(digest: str, request: Request, size: Optional[int] = None):
+    """
+    Serve a cover from the content-addressed store, optionally as a thumbnail
+    (`size` is one of THUMBNAIL_SIZES). The content behind a digest never
+    changes, so responses are cacheable forever.
+    """
+    if not _COVER_DIGEST.match(digest):
+        raise HTTPException(status_code=404, detail="Cover not found")
+    if size is not None and size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {list(THUMBNAIL_SIZES)}")
+
+    etag = f'"{digest}-{size or "original"}"'
+    headers = {'Cache-Control': 'public, max-age=31536000, immutable', 'ETag': etag}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+
+    if size is None:
+        file_path = cover_store.path(digest)
+    else:
+        file_path = await run_blocking('system', cover_store.thumbnail_path, digest, size)
+    if not file_path:
+        raise HTTPException(status_code=404, detail="Cover not found")
+    return FileResponse(file_path, headers=headers)
+
 from configparser import ConfigParser
 from core.config_utils import get_config_path
 
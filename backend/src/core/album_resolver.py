@@ -0,0 +1,85 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# How many resolved albums are remembered in memory, and for how long. This
+# only has to cover one batch of tracks; the response cache persists lookups.
+RESOLVED_ALBUM_HISTORY = 512
+RESOLVED_ALBUM_TTL = 600
+
+AlbumKey = Tuple[str, str, str]
+
+
+def album_key(file_path: str, metadata: Dict[str, Any]) -> Optional[AlbumKey]:
+    """
+    Groups tracks that belong to the same release: by album artist and album
+    when the album artist is tagged, otherwise by parent folder and album, so
+    compilations with a different artist per track still form one group.
+    """
+    album = metadata.get('album')
+    if not album:
+        return None
+    album = ' '.join(album.split()).casefold()
+    album_artist = metadata.get('albumArtist')
+    if album_artist:
+        return 'artist', ' '.join(album_artist.split()).casefold(), album
+    return 'folder', os.path.dirname(os.path.abspath(file_path)), album
+
+
+class AlbumResolver:
+    """
+    Resolves release-level data (the release and its cover art) once per
+    album and hands the result to every track of that album.
+
+    Tracks of one album are usually processed together, often by several
+    enrichment workers at once. The first track of an album runs the lookup;
+    the others wait for it instead of sending the same requests.
+    """
+
+    def __init__(self, history: int = RESOLVED_ALBUM_HISTORY, ttl: float = RESOLVED_ALBUM_TTL):
+        self.history = history
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (expires at, result)
+        self._resolved: 'OrderedDict[AlbumKey, Tuple[float, Any]]' = OrderedDict()
+        self._pending: Dict[AlbumKey, threading.Event] = {}
+
+    def resolve(self, key: AlbumKey, lookup: Callable[[], Any]) -> Any:
+        """Returns the result for the album, calling `lookup` only if no other track has."""
+        while True:
+            with self._lock:
+                resolved = self._resolved.get(key)
+                if resolved is not None and resolved[0] > time.monotonic():
+                    self._resolved.move_to_end(key)
+                    return resolved[1]
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._resolved.pop(key, None)
+                    pending = self._pending[key] = threading.Event()
+                    break
+            pending.wait()
+            with self._lock:
+                if key not in self._resolved:
+                    # The lookup failed; don't repeat it for every track of this run.
+                    return None
+
+        try:
+            result = lookup()
+        except Exception as e:
+            logging.error(f"Album lookup failed for {key[2]}: {e}")
+            result = None
+            failed = True
+        else:
+            failed = False
+
+        with self._lock:
+            if not failed:
+                self._resolved[key] = (time.monotonic() + self.ttl, result)
+                while len(self._resolved) > self.history:
+                    self._resolved.popitem(last=False)
+            del self._pending[key]
+        pending.set()
+        return result
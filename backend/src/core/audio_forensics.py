@@ -1,63 +1,93 @@
 import os
-import librosa
-import numpy as np
-from scipy import signal
-from tinytag import TinyTag
+from core.audio_probe import probe_file
+from core.spectral_analysis import analyze_spectrum, HIGH_BAND_HZ, WINDOW_COUNT, WINDOW_SECONDS
 
-def analyze_audio_final(file_path):
+# Bump whenever a change to the analysis can change its results; cached
+# verdicts of older versions are then recomputed.
+ANALYZER_VERSION = 2
+
+# Mel bands whose peak is within this range of the loudest band carry signal.
+DYNAMIC_RANGE_DB = 60
+# Files whose decoded length differs more from their headers are corrupted.
+MAX_DURATION_MISMATCH = 2.0
+
+
+def analyze_audio_final(file_path, declared_duration=None, window_count=WINDOW_COUNT, window_seconds=WINDOW_SECONDS):
     """
     Analyzes an audio file to determine if it is a genuine lossless file or a
     lossy transcode. Returns a simple string verdict.
+
+    `declared_duration` is the duration in the file's headers, in seconds; pass
+    it when the file has already been probed so the headers aren't read again.
     """
-    if not os.path.exists(file_path):
-        return "Error"
+    return analyze_audio(file_path, declared_duration, window_count, window_seconds)['verdict']
+
 
+def analyze_audio(file_path, declared_duration=None, window_count=WINDOW_COUNT, window_seconds=WINDOW_SECONDS):
+    """
+    Like analyze_audio_final, but returns the verdict together with the
+    evidence it is based on: the cutoff frequency, the high-band stereo
+    correlation and the declared and decoded durations.
+    """
+    return analyze_audio_spectrum(file_path, declared_duration, window_count, window_seconds)[0]
+
+
+def analyze_audio_spectrum(file_path, declared_duration=None, window_count=WINDOW_COUNT, window_seconds=WINDOW_SECONDS):
+    """
+    Like analyze_audio, but also returns the serialized SpectralAnalysis the
+    verdict was computed from, or None if the file couldn't be analyzed.
+    """
+    evidence = empty_evidence(declared_duration)
+    if not os.path.exists(file_path):
+        return evidence, None
     try:
-        # 1. --- File Integrity and Basic Info ---
-        y, sr = librosa.load(file_path, sr=None, mono=False)
-        actual_duration = librosa.get_duration(y=y, sr=sr)
-        metadata = TinyTag.get(file_path)
-        declared_duration = metadata.duration
-
-        if declared_duration and abs(actual_duration - declared_duration) > 2.0:
-            return "Corrupted"
-
-        # 2. --- Frequency Cutoff Detection ---
-        is_stereo = y.ndim >= 2 and y.shape[0] >= 2
-        y_mono = y[0] if is_stereo else y
-        
-        S = librosa.feature.melspectrogram(y=y_mono, sr=sr, n_mels=256, fmax=sr/2)
-        S_dB = librosa.power_to_db(S, ref=np.max)
-        max_freq_energy = np.max(S_dB, axis=1)
-        threshold_db = np.max(max_freq_energy) - 60
-        significant_bins = np.where(max_freq_energy > threshold_db)[0]
-        
-        if len(significant_bins) == 0:
-            return "Undetermined" # Or handle as an error/specific case
-
-        highest_freq_bin = significant_bins[-1]
-        mel_freqs = librosa.mel_frequencies(n_mels=256, fmax=sr/2)
-        cutoff_freq = mel_freqs[highest_freq_bin]
-
-        # 3. --- High-Frequency Stereo Analysis ---
-        stereo_correlation = None
-        if is_stereo and sr >= 44100 and cutoff_freq > 16000:
-            b, a = signal.butter(4, 16000 / (sr / 2), btype='high')
-            left_hf = signal.filtfilt(b, a, y[0])
-            right_hf = signal.filtfilt(b, a, y[1])
-            correlation_matrix = np.corrcoef(left_hf, right_hf)
-            stereo_correlation = correlation_matrix[0, 1]
-
-        # 4. --- Final Verdict Logic ---
-        if cutoff_freq > 21000:
+        spectrum = analyze_spectrum(file_path, window_count, window_seconds)
+        if declared_duration is None:
+            info = probe_file(file_path)
+            evidence['declared_duration'] = info.duration if info else None
+        evidence['verdict'] = verdict(spectrum, evidence)
+        return evidence, spectrum.to_bytes()
+    except Exception:
+        return evidence, None
+
+
+def empty_evidence(declared_duration=None):
+    """Evidence of an analysis that didn't get to a verdict."""
+    return {
+        'verdict': "Error",
+        'cutoff_freq': None,
+        'stereo_correlation': None,
+        'declared_duration': declared_duration,
+        'actual_duration': None,
+        'analyzer_version': ANALYZER_VERSION,
+    }
+
+
+def verdict(spectrum, evidence):
+    """Computes the verdict from a SpectralAnalysis, filling in the rest of `evidence`."""
+    # 1. --- File Integrity ---
+    actual_duration = spectrum.duration
+    declared_duration = evidence['declared_duration']
+    evidence['actual_duration'] = round(actual_duration, 3)
+
+    if declared_duration and abs(actual_duration - declared_duration) > MAX_DURATION_MISMATCH:
+        return "Corrupted"
+
+    # 2. --- Frequency Cutoff and High-Frequency Stereo Analysis ---
+    cutoff_freq = spectrum.cutoff_frequency(DYNAMIC_RANGE_DB)
+    if cutoff_freq is None:
+        return "Undetermined" # Or handle as an error/specific case
+
+    stereo_correlation = spectrum.stereo_correlation() if cutoff_freq > HIGH_BAND_HZ else None
+    evidence.update(cutoff_freq=round(cutoff_freq, 1), stereo_correlation=stereo_correlation)
+
+    # 3. --- Final Verdict Logic ---
+    if cutoff_freq > 21000:
+        return "Real"
+    elif cutoff_freq > 19800:
+        if spectrum.is_stereo and stereo_correlation is not None and stereo_correlation < 0.95:
             return "Real"
-        elif cutoff_freq > 19800:
-            if is_stereo and stereo_correlation is not None and stereo_correlation < 0.95:
-                return "Real"
-            else:
-                return "Fake"
         else:
             return "Fake"
-
-    except Exception:
-        return "Error"
\ No newline at end of file
+    else:
+        return "Fake"
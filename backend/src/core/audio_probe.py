@@ -0,0 +1,345 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, fields
+from typing import Optional, Tuple
+
+try:
+    from mutagen import File as MutagenFile
+    MUTAGEN_AVAILABLE = True
+except ImportError:
+    MUTAGEN_AVAILABLE = False
+
+from utils.file_system_utils import AUDIO_EXTENSIONS
+
+# Probes kept in memory per process; the SQLite cache holds the rest.
+PROBE_MEMORY_ENTRIES = 4096
+# Bump when AudioInfo changes so stale cached probes are ignored.
+PROBE_VERSION = 1
+
+ProbeKey = Tuple[str, int, int]
+
+
+@dataclass
+class AudioInfo:
+    """Everything read from an audio file's headers in one pass."""
+    title: Optional[str] = None
+    artist: Optional[str] = None
+    album: Optional[str] = None
+    albumArtist: Optional[str] = None
+    year: Optional[str] = None
+    genre: Optional[str] = None
+    duration: Optional[float] = None  # seconds
+    bitrate: Optional[int] = None  # bits per second
+    sample_rate: Optional[int] = None
+    bit_depth: Optional[int] = None
+    channels: Optional[int] = None
+    is_vbr: bool = False
+    # The embedded picture is referenced by content hash (the CoverStore
+    # digest), not by offset: mutagen doesn't expose offsets for every format.
+    picture_mime: Optional[str] = None
+    picture_size: Optional[int] = None
+    picture_digest: Optional[str] = None
+    # False for stream-only probes made for the share scanner, which skip the
+    # tags and picture; those are probed again in full when they're needed.
+    complete: bool = True
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'AudioInfo':
+        names = {field.name for field in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in names})
+
+
+class ShareTag:
+    """The subset of a TinyTag result the share scanner reads, built from a probe."""
+
+    __slots__ = ("bitrate", "samplerate", "bitdepth", "duration", "is_vbr")
+
+    def __init__(self, info: AudioInfo):
+        self.bitrate = info.bitrate / 1000 if info.bitrate else None  # kbps, like TinyTag
+        self.samplerate = info.sample_rate
+        self.bitdepth = info.bit_depth
+        self.duration = info.duration
+        self.is_vbr = info.is_vbr
+
+
+def _has_tag(tags, key: str) -> bool:
+    # Vorbis comment tags (FLAC, Ogg) raise ValueError for keys that aren't valid
+    # comment names, such as the MP4 '\xa9alb' style keys checked below.
+    try:
+        return key in tags
+    except ValueError:
+        return False
+
+
+def _first(value) -> str:
+    return str(value[0] if isinstance(value, list) else value)
+
+
+def _read_tags(audio_file, info: AudioInfo):
+    tags = audio_file.tags
+
+    if hasattr(tags, 'as_dict'):
+        tag_dict = tags.as_dict()
+        for attribute, keys in (
+            ('title', ['title', 'TITLE', 'Title']),
+            ('artist', ['artist', 'ARTIST', 'Artist', 'albumartist', 'ALBUMARTIST']),
+            ('album', ['album', 'ALBUM', 'Album']),
+            ('albumArtist', ['albumartist', 'ALBUMARTIST', 'album artist', 'ALBUM ARTIST']),
+            ('genre', ['genre', 'GENRE', 'Genre']),
+        ):
+            for key in keys:
+                if key in tag_dict:
+                    setattr(info, attribute, _first(tag_dict[key]))
+                    break
+
+        for key in ['date', 'DATE', 'Date', 'year', 'YEAR']:
+            if key in tag_dict:
+                year_str = _first(tag_dict[key])
+                if len(year_str) >= 4:
+                    info.year = year_str[:4]
+                break
+    else:
+        for attribute, keys in (
+            ('title', ['TIT2', 'TITLE', '\xa9nam']),
+            ('artist', ['TPE1', 'ARTIST', '\xa9ART']),
+            ('albumArtist', ['TPE2', 'ALBUMARTIST', 'aART']),
+        ):
+            for key in keys:
+                if _has_tag(tags, key):
+                    setattr(info, attribute, _first(tags[key]))
+                    break
+
+    for key in ['TALB', 'ALBUM', '\xa9alb']:
+        if _has_tag(tags, key):
+            info.album = _first(tags[key])
+            break
+
+    for key in ['TDRC', 'DATE', 'YEAR', '\xa9day']:
+        if _has_tag(tags, key):
+            year_str = _first(tags[key])
+            info.year = year_str[:4] if len(year_str) >= 4 else year_str
+            break
+
+    for key in ['TCON', 'GENRE', '\xa9gen']:
+        if _has_tag(tags, key):
+            info.genre = _first(tags[key])
+            break
+
+
+def _picture(audio_file) -> Tuple[Optional[bytes], Optional[str]]:
+    """Returns the first embedded picture and its mime type."""
+    tags = audio_file.tags
+    if tags:
+        if 'APIC:' in tags or 'APIC' in tags:
+            for key in tags.keys():
+                if key.startswith('APIC'):
+                    apic = tags[key]
+                    if hasattr(apic, 'data'):
+                        return apic.data, getattr(apic, 'mime', 'image/jpeg')
+        if _has_tag(tags, 'covr') and tags['covr']:
+            cover = tags['covr'][0]
+            return bytes(cover), 'image/png' if getattr(cover, 'imageformat', None) == 14 else 'image/jpeg'
+    if getattr(audio_file, 'pictures', None):
+        picture = audio_file.pictures[0]
+        return picture.data, getattr(picture, 'mime', 'image/jpeg')
+    return None, None
+
+
+def _open(file_path: str, attempts: int = 3):
+    # Retry logic for file access; files that are still being written can fail to open.
+    for i in range(attempts):
+        try:
+            return MutagenFile(file_path)
+        except Exception as e:
+            if i == attempts - 1:
+                logging.error(f"Error reading audio headers from {file_path}: {str(e)[:200]}")
+                return None
+            time.sleep(0.5)
+    return None
+
+
+def _read_stream(audio_file, info: AudioInfo):
+    stream = audio_file.info
+    if getattr(stream, 'length', None):
+        info.duration = float(stream.length)
+    if getattr(stream, 'bitrate', None):
+        info.bitrate = int(stream.bitrate)
+    info.sample_rate = getattr(stream, 'sample_rate', None)
+    info.bit_depth = getattr(stream, 'bits_per_sample', None)
+    info.channels = getattr(stream, 'channels', None)
+    info.is_vbr = str(getattr(stream, 'bitrate_mode', '')).endswith('VBR')
+
+
+def probe_file(file_path: str, cover_store=None) -> Optional[AudioInfo]:
+    """Reads an audio file's headers once, without caching. None if it can't be parsed."""
+    if not MUTAGEN_AVAILABLE:
+        return None
+    audio_file = _open(file_path)
+    if audio_file is None:
+        return None
+
+    info = AudioInfo()
+    try:
+        if audio_file.tags:
+            _read_tags(audio_file, info)
+
+        data, mime = _picture(audio_file)
+        if data:
+            info.picture_mime = mime
+            info.picture_size = len(data)
+            # Same digest as CoverStore, so the cover can be found without reading the file again.
+            info.picture_digest = cover_store.put(data) if cover_store else hashlib.sha256(data).hexdigest()[:32]
+
+        _read_stream(audio_file, info)
+    except Exception as e:
+        logging.error(f"Error processing metadata for {file_path}: {str(e)[:200]}")
+    return info
+
+
+def probe_stream(file_path: str) -> Optional[AudioInfo]:
+    """
+    Reads only the stream attributes, with a single attempt to open the file:
+    no tags, no picture hashing. None if it can't be parsed.
+    """
+    if not MUTAGEN_AVAILABLE:
+        return None
+    audio_file = _open(file_path, attempts=1)
+    if audio_file is None:
+        return None
+
+    info = AudioInfo(complete=False)
+    try:
+        _read_stream(audio_file, info)
+    except Exception as e:
+        logging.error(f"Error processing metadata for {file_path}: {str(e)[:200]}")
+    return info
+
+
+class AudioProber:
+    """
+    Single-pass audio header reader shared by metadata extraction, forensics
+    and the Soulseek share scanner.
+
+    Results are cached by (path, size, mtime), in memory and in SQLite, so a
+    file is parsed again only after it changes. The share scanner runs in a
+    separate process; the prober is picklable for that and reopens the
+    SQLite cache there, so both processes reuse each other's probes.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None, cover_store=None,
+                 memory_entries: int = PROBE_MEMORY_ENTRIES):
+        self.cache_path = cache_path
+        self.cover_store = cover_store
+        self.memory_entries = memory_entries
+        self._lock = threading.Lock()
+        self._memory: 'OrderedDict[ProbeKey, AudioInfo]' = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def __getstate__(self):
+        return {'cache_path': self.cache_path, 'memory_entries': self.memory_entries}
+
+    def __setstate__(self, state):
+        self.__init__(state['cache_path'], memory_entries=state['memory_entries'])
+
+    def probe(self, file_path: str, stat: Optional[os.stat_result] = None) -> Optional[AudioInfo]:
+        """Returns the file's AudioInfo, from cache if the file hasn't changed since it was probed."""
+        try:
+            stat = stat or os.stat(file_path)
+        except OSError:
+            return None
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+        info = self._cached(key)
+        if info is not None and info.complete:
+            return info
+
+        info = probe_file(file_path, self.cover_store)
+        if info is not None:
+            self._store(key, info)
+        return info
+
+    def picture(self, file_path: str) -> Optional[bytes]:
+        """Reads the embedded picture; only needed when a probe's cover isn't in the cover store."""
+        audio_file = _open(file_path) if MUTAGEN_AVAILABLE else None
+        return _picture(audio_file)[0] if audio_file is not None else None
+
+    def share_tag(self, file_path: str, size: int) -> Optional[ShareTag]:
+        """Audio attributes for the share scanner, or None to let it fall back to its own parser."""
+        if not file_path.lower().endswith(AUDIO_EXTENSIONS):
+            return None
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+        # Any probe will do, full or stream-only. Shares are rescanned often
+        # and most files never change, so a miss only reads the stream.
+        info = self._cached(key)
+        if info is None:
+            info = probe_stream(file_path)
+            if info is not None:
+                self._store(key, info)
+        return ShareTag(info) if info is not None else None
+
+    # --- Cache ---
+
+    def _cached(self, key: ProbeKey) -> Optional[AudioInfo]:
+        with self._lock:
+            info = self._memory.get(key)
+            if info is not None:
+                self._memory.move_to_end(key)
+                return info
+            conn = self._connection()
+            if conn is None:
+                return None
+            row = conn.execute(
+                "SELECT data FROM probes WHERE path = ? AND size = ? AND mtime_ns = ? AND version = ?",
+                (*key, PROBE_VERSION),
+            ).fetchone()
+            if row is None:
+                return None
+            info = AudioInfo.from_dict(json.loads(row[0]))
+            self._remember(key, info)
+            return info
+
+    def _store(self, key: ProbeKey, info: AudioInfo):
+        with self._lock:
+            self._remember(key, info)
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO probes (path, size, mtime_ns, version, data) VALUES (?, ?, ?, ?, ?)",
+                    (*key, PROBE_VERSION, json.dumps(asdict(info))),
+                )
+            except sqlite3.Error as e:
+                logging.warning(f"Could not cache probe of {key[0]}: {e}")
+
+    def _remember(self, key: ProbeKey, info: AudioInfo):
+        # Called with the lock held.
+        self._memory[key] = info
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        # Called with the lock held. Opened lazily so an unpickled prober connects in its own process.
+        if self._conn is None and self.cache_path:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            conn = sqlite3.connect(self.cache_path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS probes ("
+                " path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+                " version INTEGER NOT NULL, data TEXT NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from utils.concurrency import run_blocking
+
+from .library_store import LibraryStore
+
+# Change kinds recorded in the library change log.
+SONG_ADDED = 'song.added'
+SONG_UPDATED = 'song.updated'
+SONG_REMOVED = 'song.removed'
+SONG_MOVED = 'song.moved'
+LYRICS_CACHED = 'lyrics.cached'
+PLAYLIST_CHANGED = 'playlist.changed'
+PLAYLIST_DELETED = 'playlist.deleted'
+
+
+class ChangeFeed:
+    """
+    Sequenced feed of library changes backed by the store's change log.
+
+    Writers record changes inside their transaction; once it commits, every
+    waiting stream is woken up. Streams run on the event loop, so they are
+    woken with call_soon_threadsafe instead of holding a thread each.
+    """
+
+    def __init__(self, store: LibraryStore):
+        self.store = store
+        self._lock = threading.Lock()
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        store.add_commit_listener(self._notify)
+
+    def _notify(self):
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The loop was closed; the waiter is dropped on its own exit.
+                pass
+
+    def latest_seq(self) -> int:
+        return self.store.latest_change_seq()
+
+    def read(self, since: int, limit: int = 500) -> Dict[str, Any]:
+        """
+        Returns the changes after `since`. If older entries were already pruned
+        from the log, or `since` is past its end because the library database
+        was recreated, `reset` is set and the client has to reload in full.
+        """
+        latest = self.latest_seq()
+        oldest = self.store.oldest_change_seq()
+        reset = oldest > since + 1 or since > latest
+        changes: List[Dict[str, Any]] = [] if since > latest else self.store.changes_since(since, limit)
+        return {'changes': changes, 'latest': max(latest, changes[-1]['seq']) if changes else latest, 'reset': reset}
+
+    async def wait(self, since: int, timeout: Optional[float] = None) -> bool:
+        """Waits until a change after `since` is committed, or the timeout passes."""
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            # Checked after registering so a commit in between is not missed.
+            if await run_blocking('library_io', self.latest_seq) > since:
+                return True
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
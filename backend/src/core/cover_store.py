@@ -0,0 +1,107 @@
+import io
+import os
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# Square bounding boxes of the pre-generated thumbnails, in pixels.
+THUMBNAIL_SIZES = (64, 160, 320)
+
+_IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF8', '.gif'),
+    (b'RIFF', '.webp'),
+)
+_EXTENSIONS = tuple(extension for _, extension in _IMAGE_SIGNATURES)
+
+
+def _image_extension(data: bytes) -> str:
+    for signature, extension in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    return '.jpg'
+
+
+class CoverStore:
+    """
+    Content-addressed cover art storage.
+
+    Covers are stored once per distinct image under covers/<aa>/<digest>.<ext>,
+    where the digest is a hash of the image bytes, so tracks and albums that
+    share artwork share one file, and storing a known cover writes nothing.
+    Thumbnails in THUMBNAIL_SIZES are generated once, when a cover is first
+    stored. Stored files never change, so they can be cached forever.
+    """
+
+    def __init__(self, covers_path: str):
+        self.covers_path = covers_path
+        os.makedirs(self.covers_path, exist_ok=True)
+
+    def put(self, data: bytes) -> str:
+        """Stores cover bytes if they are new and returns their digest."""
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        if self.path(digest):
+            return digest
+
+        target = os.path.join(self.covers_path, self.relative_path(digest, _image_extension(data)))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temporary = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, target)
+
+        for size in THUMBNAIL_SIZES:
+            self._write_thumbnail(digest, data, size)
+        return digest
+
+    def relative_path(self, digest: str, extension: Optional[str] = None) -> str:
+        """Path of a cover relative to the covers directory, as stored in song metadata."""
+        if extension is None:
+            path = self.path(digest)
+            extension = os.path.splitext(path)[1] if path else '.jpg'
+        return f"{digest[:2]}/{digest}{extension}"
+
+    def path(self, digest: str) -> Optional[str]:
+        """Absolute path of the stored original, or None if the digest is unknown."""
+        directory = os.path.join(self.covers_path, digest[:2])
+        for extension in _EXTENSIONS:
+            candidate = os.path.join(directory, digest + extension)
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    def thumbnail_path(self, digest: str, size: int) -> Optional[str]:
+        """Absolute path of a thumbnail, generating it if it is missing. None if that isn't possible."""
+        target = os.path.join(self.covers_path, digest[:2], f"{digest}_{size}.jpg")
+        if os.path.exists(target):
+            return target
+        original = self.path(digest)
+        if not original:
+            return None
+        with open(original, 'rb') as f:
+            data = f.read()
+        return target if self._write_thumbnail(digest, data, size) else None
+
+    def _write_thumbnail(self, digest: str, data: bytes, size: int) -> bool:
+        if not PIL_AVAILABLE:
+            return False
+        target = os.path.join(self.covers_path, digest[:2], f"{digest}_{size}.jpg")
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image = image.convert('RGB')
+                image.thumbnail((size, size))
+                temporary = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+                image.save(temporary, 'JPEG', quality=85)
+            os.replace(temporary, target)
+            return True
+        except Exception as e:
+            logging.warning(f"Could not create {size}px thumbnail for cover {digest}: {e}")
+            return False
@@ -1,27 +1,171 @@
 import os
+import time
 import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
 from watchdog.events import FileSystemEventHandler
 from core.library_service import LibraryService
-from core.song_processor import SongProcessor
+from core.song_processor import SongProcessor, PRIORITY_INTERACTIVE
+from utils.file_system_utils import AUDIO_EXTENSIONS
+
 
 class MusicFileHandler(FileSystemEventHandler):
-    def __init__(self, library_service: LibraryService, song_processor: SongProcessor, music_directory: str):
+    """
+    Turns file system events into library updates without blocking the
+    observer thread.
+
+    Created and modified files are coalesced per path and only queued for
+    processing once their size has stayed the same for a quiet period, so a
+    file that is still being written is processed once, when it is complete.
+    Moves and renames update the existing song record instead of deleting
+    and reprocessing it. Deletions are batched into a single transaction.
+    """
+
+    def __init__(self, library_service: LibraryService, song_processor: SongProcessor, music_directory: str,
+                 quiet_period: float = 2.0, poll_interval: float = 0.5):
         self.library_service = library_service
         self.song_processor = song_processor
         self.music_directory = music_directory
+        self.quiet_period = quiet_period
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        # path -> [time of the last event, size at the last check]
+        self._pending: Dict[str, list] = {}
+        self._pending_deletes: Set[str] = set()
+        # (source, destination, is_directory) in the order they happened
+        self._pending_moves: List[Tuple[str, str, bool]] = []
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._debounce_loop, name="watcher-debounce", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    # --- Watchdog callbacks (observer thread, must stay cheap) ---
 
     def on_created(self, event):
         if not event.is_directory and self._is_audio_file(event.src_path):
             logging.info(f"New audio file detected: {event.src_path}")
-            # Process with the absolute path
-            self.song_processor.process_new_song(event.src_path)
+            self._touch(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory and self._is_audio_file(event.src_path):
+            self._touch(event.src_path)
 
     def on_deleted(self, event):
         if not event.is_directory and self._is_audio_file(event.src_path):
             logging.info(f"Audio file deleted: {event.src_path}")
-            # Convert to relative path for removal from DB
-            relative_path = os.path.relpath(event.src_path, self.music_directory)
-            self.library_service.remove_song(relative_path)
+            with self._lock:
+                self._pending.pop(event.src_path, None)
+                self._pending_deletes.add(event.src_path)
+
+    def on_moved(self, event):
+        src_path, dest_path = event.src_path, event.dest_path
+        with self._lock:
+            if not event.is_directory:
+                pending = self._pending.pop(src_path, None)
+                self._pending_deletes.discard(dest_path)
+                if pending and self._is_audio_file(dest_path) and self._is_inside(dest_path):
+                    # Still settling under the old name; keep waiting under the new one.
+                    self._pending[dest_path] = pending
+                    return
+            # Renaming updates the store, so it is left to the debounce thread.
+            self._pending_moves.append((src_path, dest_path, event.is_directory))
+
+    # --- Debouncing ---
+
+    def _move(self, src_path: str, dest_path: str, is_directory: bool):
+        if is_directory:
+            if self._is_inside(src_path) and self._is_inside(dest_path):
+                moved = self.library_service.rename_songs_in_directory(self._relative(src_path), self._relative(dest_path))
+                logging.info(f"Folder moved: {src_path} -> {dest_path} ({moved} songs updated)")
+            return
+
+        src_is_audio = self._is_audio_file(src_path) and self._is_inside(src_path)
+        dest_is_audio = self._is_audio_file(dest_path) and self._is_inside(dest_path)
+
+        if src_is_audio and dest_is_audio:
+            if self.library_service.rename_song(self._relative(src_path), self._relative(dest_path)):
+                logging.info(f"Audio file moved: {src_path} -> {dest_path}")
+                return
+            # Also reached for files of a folder move already handled above.
+            if self.library_service.get_song(self._relative(dest_path)):
+                return
+
+        if dest_is_audio:
+            # Moved in from elsewhere, e.g. a finished download leaving the incomplete folder.
+            logging.info(f"Audio file moved into library: {dest_path}")
+            self._touch(dest_path)
+        elif src_is_audio:
+            with self._lock:
+                self._pending_deletes.add(src_path)
+
+    def _touch(self, path: str):
+        with self._lock:
+            self._pending_deletes.discard(path)
+            entry = self._pending.get(path)
+            if entry:
+                entry[0] = time.monotonic()
+            else:
+                self._pending[path] = [time.monotonic(), None]
+
+    def _debounce_loop(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self._flush()
+            except Exception as e:
+                logging.error(f"File watcher failed to flush events: {e}", exc_info=True)
+
+    def _flush(self):
+        now = time.monotonic()
+        with self._lock:
+            moves, self._pending_moves = self._pending_moves, []
+            deletes, self._pending_deletes = self._pending_deletes, set()
+            due = [(path, entry) for path, entry in self._pending.items() if now - entry[0] >= self.quiet_period]
+
+        # Moves go first, so a file that was moved and then deleted is removed under its new path.
+        for src_path, dest_path, is_directory in moves:
+            try:
+                self._move(src_path, dest_path, is_directory)
+            except Exception as e:
+                logging.error(f"File watcher failed to apply move {src_path} -> {dest_path}: {e}", exc_info=True)
+
+        if deletes:
+            self.library_service.remove_songs([self._relative(path) for path in deletes])
+
+        for path, entry in due:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                with self._lock:
+                    self._pending.pop(path, None)
+                continue
+
+            with self._lock:
+                if self._pending.get(path) is not entry:
+                    continue
+                if entry[1] != stat.st_size:
+                    # Still growing (or first check): wait another quiet period.
+                    entry[0], entry[1] = now, stat.st_size
+                    continue
+                del self._pending[path]
+
+            # Finished downloads are handed to the queue directly; don't ingest them twice.
+            if self.library_service.get_manifest_entry(self._relative(path)) == (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+                continue
+            # Queued or in-flight jobs for the same path are deduplicated by the queue.
+            self.song_processor.enqueue(path, PRIORITY_INTERACTIVE)
+
+    # --- Helpers ---
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(path, self.music_directory)
+
+    def _is_inside(self, path: str) -> bool:
+        return not os.path.relpath(path, self.music_directory).startswith(os.pardir)
 
     def _is_audio_file(self, path: str) -> bool:
-        return path.lower().endswith(('.mp3', '.wav', '.flac', '.m4a', '.aac', '.ogg', '.wma', '.opus'))
\ No newline at end of file
+        return path.lower().endswith(AUDIO_EXTENSIONS)
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import struct
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# Bytes hashed at the start and at the end of the audio data.
+FINGERPRINT_BLOCK = 64 * 1024
+# Verdicts that may only reflect a passing condition, like a file that is
+# still being written, are not cached.
+UNCACHED_VERDICTS = ('Error',)
+# Budget for stored spectral analyses (about 50-100 KB each); the least
+# recently used are evicted first. Verdicts are small and never evicted.
+SPECTRA_MAX_BYTES = 256 * 1024 * 1024
+
+
+def _flac_audio_span(f, size: int) -> Optional[Tuple[int, int]]:
+    # fLaC, then metadata blocks with a 4-byte header: last-block flag, type, 24-bit length.
+    offset = 4
+    while offset + 4 <= size:
+        f.seek(offset)
+        header = f.read(4)
+        if len(header) < 4:
+            return None
+        offset += 4 + int.from_bytes(header[1:4], 'big')
+        if header[0] & 0x80:
+            return offset, size - offset
+    return None
+
+
+def _wav_audio_span(f, size: int) -> Optional[Tuple[int, int]]:
+    # RIFF chunks, each an id, a little-endian length and data padded to an even length.
+    offset = 12
+    while offset + 8 <= size:
+        f.seek(offset)
+        chunk_id, length = struct.unpack('<4sI', f.read(8))
+        if chunk_id == b'data':
+            return offset + 8, min(length, size - offset - 8)
+        offset += 8 + length + (length & 1)
+    return None
+
+
+def audio_span(file_path: str) -> Tuple[int, int]:
+    """
+    Offset and length of the audio data of a FLAC or WAV file, so tag edits
+    don't change its fingerprint. Other files are taken whole.
+    """
+    size = os.path.getsize(file_path)
+    try:
+        with open(file_path, 'rb') as f:
+            magic = f.read(12)
+            span = None
+            if magic.startswith(b'fLaC'):
+                span = _flac_audio_span(f, size)
+            elif magic.startswith(b'RIFF') and magic[8:12] == b'WAVE':
+                span = _wav_audio_span(f, size)
+    except (OSError, struct.error):
+        span = None
+    return span or (0, size)
+
+
+def content_fingerprint(file_path: str) -> str:
+    """Cheap identity of a file's audio: its length plus a hash of its first and last FINGERPRINT_BLOCK bytes."""
+    offset, length = audio_span(file_path)
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        digest.update(f.read(min(length, FINGERPRINT_BLOCK)))
+        if length > FINGERPRINT_BLOCK:
+            f.seek(offset + max(FINGERPRINT_BLOCK, length - FINGERPRINT_BLOCK))
+            digest.update(f.read(FINGERPRINT_BLOCK))
+    return f"{length}-{digest.hexdigest()[:32]}"
+
+
+class ForensicCache:
+    """
+    Persistent store of forensic verdicts and their evidence, keyed by the
+    content fingerprint of the audio and the analyzer version.
+
+    Reprocessing, moving or re-tagging a file reuses its verdict; the
+    analysis only runs again when the audio itself changes or
+    ANALYZER_VERSION is bumped. The serialized SpectralAnalysis behind a
+    verdict is kept too, within `spectra_max_bytes`, so a report can be
+    drawn without decoding the file.
+    """
+
+    def __init__(self, path: str, analyzer_version: int, spectra_max_bytes: int = SPECTRA_MAX_BYTES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.analyzer_version = analyzer_version
+        self.spectra_max_bytes = spectra_max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            " fingerprint TEXT NOT NULL, analyzer_version INTEGER NOT NULL, evidence TEXT NOT NULL,"
+            " created_at REAL NOT NULL, PRIMARY KEY (fingerprint, analyzer_version))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spectra ("
+            " fingerprint TEXT NOT NULL, analyzer_version INTEGER NOT NULL, data BLOB NOT NULL,"
+            " size INTEGER NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (fingerprint, analyzer_version))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_spectra_accessed ON spectra (accessed_at)")
+        self._conn.execute("DELETE FROM verdicts WHERE analyzer_version != ?", (analyzer_version,))
+        self._conn.execute("DELETE FROM spectra WHERE analyzer_version != ?", (analyzer_version,))
+        self._spectra_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM spectra").fetchone()[0]
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT evidence FROM verdicts WHERE fingerprint = ? AND analyzer_version = ?",
+                (fingerprint, self.analyzer_version)
+            ).fetchone()
+            if row is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+        return json.loads(row[0])
+
+    def set(self, fingerprint: str, evidence: Dict[str, Any]):
+        if evidence.get('verdict') in UNCACHED_VERDICTS:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (fingerprint, analyzer_version, evidence, created_at) VALUES (?, ?, ?, ?)",
+                (fingerprint, self.analyzer_version, json.dumps(evidence), time.time())
+            )
+
+    def get_spectrum(self, fingerprint: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM spectra WHERE fingerprint = ? AND analyzer_version = ?",
+                (fingerprint, self.analyzer_version)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE spectra SET accessed_at = ? WHERE fingerprint = ? AND analyzer_version = ?",
+                (time.time(), fingerprint, self.analyzer_version)
+            )
+        return row[0]
+
+    def set_spectrum(self, fingerprint: str, data: bytes):
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM spectra WHERE fingerprint = ? AND analyzer_version = ?",
+                (fingerprint, self.analyzer_version)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO spectra (fingerprint, analyzer_version, data, size, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (fingerprint, self.analyzer_version, data, len(data), time.time())
+            )
+            self._spectra_size += len(data) - (old[0] if old else 0)
+            if self._spectra_size > self.spectra_max_bytes:
+                self._evict_spectra()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+            spectra = self._conn.execute("SELECT COUNT(*) FROM spectra").fetchone()[0]
+            return {'entries': count, 'spectra': spectra, 'spectra_bytes': self._spectra_size,
+                    'hits': self._hits, 'misses': self._misses}
+
+    def _evict_spectra(self):
+        # Called with the lock held. Frees a tenth of the budget at once so eviction doesn't run on every write.
+        target = self.spectra_max_bytes * 0.9
+        rows = self._conn.execute("SELECT fingerprint, analyzer_version, size FROM spectra ORDER BY accessed_at").fetchall()
+        evicted = []
+        for fingerprint, version, size in rows:
+            if self._spectra_size <= target:
+                break
+            evicted.append((fingerprint, version))
+            self._spectra_size -= size
+        self._conn.executemany("DELETE FROM spectra WHERE fingerprint = ? AND analyzer_version = ?", evicted)
+        logging.info(f"Forensic cache evicted {len(evicted)} spectral analyses")
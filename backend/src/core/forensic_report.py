@@ -0,0 +1,101 @@
+from typing import Any, Dict, List, Optional
+
+from core.spectral_analysis import SpectralAnalysis, HIGH_BAND_HZ, SPECTROGRAM_FLOOR_DB
+
+# Spectrogram tiles are at most TILE_COLUMNS wide. Level 0 of the pyramid
+# fits in one tile; every following level doubles the time and frequency
+# resolution, up to the stored spectrogram.
+TILE_COLUMNS = 64
+# Points of the peak-energy curve; each is the peak of the bins it covers.
+PEAK_CURVE_POINTS = 256
+
+
+def spectrogram_pyramid(spectrum: SpectralAnalysis) -> List[Any]:
+    """
+    Levels of the spectrogram from coarsest to finest, each a (bins, columns)
+    uint8 array like SpectralAnalysis.spectrogram. Coarser levels average
+    2x2 blocks of the next one.
+    """
+    import numpy as np
+
+    levels = [spectrum.spectrogram]
+    while levels[-1].shape[1] > TILE_COLUMNS and levels[-1].shape[0] > 1:
+        finer = levels[-1].astype(np.uint16)
+        bins, columns = finer.shape[0] // 2 * 2, finer.shape[1] // 2 * 2
+        blocks = finer[:bins, :columns].reshape(bins // 2, 2, columns // 2, 2)
+        levels.append(((blocks.sum(axis=(1, 3)) + 2) // 4).astype(np.uint8))
+    return levels[::-1]
+
+
+def spectrogram_tile(levels: List[Any], level: int, tile: int) -> Optional[Any]:
+    """Columns [tile * TILE_COLUMNS, (tile + 1) * TILE_COLUMNS) of a pyramid level, or None if out of range."""
+    if not 0 <= level < len(levels):
+        return None
+    data = levels[level]
+    if not 0 <= tile < max(1, -(-data.shape[1] // TILE_COLUMNS)):
+        return None
+    return data[:, tile * TILE_COLUMNS:(tile + 1) * TILE_COLUMNS]
+
+
+def _phase_coherence(snippet) -> Optional[float]:
+    # Phase-locking value of the two high-band channels: 1 when their phases
+    # move together (joint stereo, mono upmix), near 0 for independent channels.
+    import numpy as np
+    from scipy import signal
+
+    if len(snippet) != 2:
+        return None
+    left, right = np.angle(signal.hilbert(snippet, axis=1))
+    return float(np.abs(np.exp(1j * (left - right)).mean()))
+
+
+def _rounded(values, digits: int) -> List[Optional[float]]:
+    return [None if value is None else round(float(value), digits) for value in values]
+
+
+def build_report(evidence: Dict[str, Any], spectrum: SpectralAnalysis, levels: List[Any]) -> Dict[str, Any]:
+    """
+    The forensic report as plain data for the frontend to draw: the verdict
+    and its evidence, the spectrogram pyramid layout (tiles are fetched
+    separately), the peak-energy curve and the high-band correlation summary.
+    """
+    import numpy as np
+
+    peak_db = spectrum.peak_db[:len(spectrum.peak_db) // PEAK_CURVE_POINTS * PEAK_CURVE_POINTS]
+    step = len(peak_db) // PEAK_CURVE_POINTS
+    frequencies = spectrum.bin_frequencies()[:len(peak_db)].reshape(PEAK_CURVE_POINTS, step).mean(axis=1)
+    measured = evidence.get('stereo_correlation') is not None
+
+    return {
+        'evidence': evidence,
+        'sample_rate': spectrum.sample_rate,
+        'channels': spectrum.channels,
+        'duration': round(spectrum.duration, 3),
+        'windows': [
+            {'start': round(float(start), 3), 'columns': int(columns)}
+            for start, columns in zip(spectrum.window_starts, spectrum.window_columns)
+        ],
+        'spectrogram': {
+            # Values are 0-255 for SPECTROGRAM_FLOOR_DB below the peak up to the peak;
+            # rows run from 0 Hz up to max_frequency.
+            'floor_db': SPECTROGRAM_FLOOR_DB,
+            'max_frequency': spectrum.sample_rate / 2,
+            'tile_columns': TILE_COLUMNS,
+            'levels': [
+                {'level': index, 'bins': int(data.shape[0]), 'columns': int(data.shape[1]),
+                 'tiles': max(1, -(-data.shape[1] // TILE_COLUMNS))}
+                for index, data in enumerate(levels)
+            ],
+        },
+        'peak_energy': {
+            'frequencies': _rounded(frequencies, 1),
+            'db': _rounded(peak_db.reshape(PEAK_CURVE_POINTS, step).max(axis=1), 2),
+        },
+        'hf_correlation': {
+            'high_band_hz': HIGH_BAND_HZ,
+            'measured': measured,
+            'overall': evidence.get('stereo_correlation'),
+            'per_window': _rounded(spectrum.window_correlations(), 4) if measured else [],
+            'phase_coherence': round(_phase_coherence(spectrum.hf_snippet), 4) if measured and len(spectrum.hf_snippet) else None,
+        },
+    }
@@ -0,0 +1,360 @@
+import os
+import time
+import uuid
+import queue
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.audio_forensics import analyze_audio_spectrum, empty_evidence, ANALYZER_VERSION
+from core.forensic_cache import ForensicCache, content_fingerprint
+
+# Worker processes, each running one analysis at a time.
+FORENSIC_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+# Seconds an analysis may run before its worker is killed.
+FORENSIC_TIMEOUT = 300.0
+# How often a running task checks for cancellation and its deadline.
+POLL_INTERVAL = 0.25
+# How many finished tasks are kept for the status endpoint.
+FINISHED_TASK_HISTORY = 50
+# Built data reports kept in memory, so their tiles are served without rebuilding them.
+REPORT_MEMO_ENTRIES = 16
+
+
+class ForensicTaskError(Exception):
+    """Raised by ForensicTask.result when the task failed, timed out or was cancelled."""
+
+
+def _worker_main(conn):
+    # Runs in a worker process: executes (func, args) messages until told to stop.
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if message is None:
+            return
+        func, args = message
+        try:
+            conn.send((True, func(*args)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+def _render_report(output_path: str, filename: str, evidence: Dict[str, Any], spectrum: bytes) -> Dict[str, Any]:
+    # Runs in a worker process.
+    from core.forensic_visualizer import create_visual_report
+    from core.spectral_analysis import SpectralAnalysis
+
+    create_visual_report(filename, evidence, SpectralAnalysis.from_bytes(spectrum), output_path)
+    return {"report_path": output_path}
+
+
+class _Worker:
+    """A worker process and the pipe it receives tasks on."""
+
+    def __init__(self):
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(child,), name='forensics-worker', daemon=True)
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(5)
+        self.conn.close()
+
+
+class ForensicTask:
+    """A queued or running analysis. Several callers may wait on the same task."""
+
+    def __init__(self, kind: str, file_path: str, func: Callable, args: Tuple, timeout: float,
+                 on_cancel: Optional[Callable[['ForensicTask'], None]] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.file_path = file_path
+        self.func = func
+        self.args = args
+        self.timeout = timeout
+        self.status = 'queued'  # queued, running, done, failed, timeout, cancelled
+        self.result_value: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._on_cancel = on_cancel
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Cancels the task. A queued task finishes right away; a running analysis has its worker killed."""
+        self._cancel.set()
+        if self._on_cancel is not None:
+            self._on_cancel(self)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def result(self, is_cancelled: Optional[Callable[[], bool]] = None) -> Any:
+        """Waits for the task, cancelling it once `is_cancelled()` returns True."""
+        while not self.wait(POLL_INTERVAL):
+            if is_cancelled is not None and is_cancelled():
+                self.cancel()
+        if self.status != 'done':
+            raise ForensicTaskError(self.error or self.status)
+        return self.result_value
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = self.finished_at or time.time()
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'file_path': self.file_path,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed': round(now - self.started_at, 3) if self.started_at else None,
+        }
+
+
+class ForensicService:
+    """
+    Runs forensic analysis, both ingestion verdicts and visual reports, in
+    dedicated worker processes, so it doesn't compete with the API and the
+    ingestion threads for the GIL.
+
+    Tasks wait in a FIFO queue for one of `workers` processes. A task for a
+    file that is already queued or running is not queued again; the callers
+    share it. A task that runs longer than its timeout, or is cancelled
+    while running, has its worker process killed and replaced.
+
+    Verdicts and the spectral analyses behind them are looked up in the
+    ForensicCache first, so only new audio is decoded, and a report of an
+    ingested file is drawn from the stored analysis.
+    """
+
+    def __init__(self, cache_path: str, workers: Optional[int] = None, timeout: float = FORENSIC_TIMEOUT):
+        self.cache = ForensicCache(cache_path, ANALYZER_VERSION)
+        self.workers = workers or FORENSIC_WORKERS
+        self.timeout = timeout
+        self._queue: 'queue.Queue[ForensicTask]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._active: Dict[Tuple[str, str], ForensicTask] = {}
+        self._finished: 'OrderedDict[str, ForensicTask]' = OrderedDict()
+        self._counts = {'done': 0, 'failed': 0, 'timeout': 0, 'cancelled': 0}
+        self._started = False
+        self._reports: 'OrderedDict[str, Tuple[Dict[str, Any], List[Any]]]' = OrderedDict()
+
+    # --- Public API ---
+
+    def submit(self, kind: str, file_path: str, func: Callable, *args, timeout: Optional[float] = None) -> Tuple[ForensicTask, bool]:
+        """
+        Queues `func(*args)` to run in a worker process. `func` must be a
+        module-level function. Returns the task and whether it was newly
+        created; a queued or running task of the same kind for the same file
+        is returned instead of a new one.
+        """
+        key = (kind, os.path.abspath(file_path))
+        with self._lock:
+            existing = self._active.get(key)
+            if existing is not None and not existing.cancelled:
+                return existing, False
+            task = ForensicTask(kind, key[1], func, args, timeout or self.timeout, self._cancel_queued)
+            self._active[key] = task
+            self._ensure_started()
+        self._queue.put(task)
+        return task, True
+
+    def evidence(self, file_path: str, declared_duration: Optional[float] = None) -> Dict[str, Any]:
+        """The verdict and evidence for a file, from the cache or from a worker."""
+        fingerprint = self._fingerprint(file_path)
+        if fingerprint is not None:
+            evidence = self.cache.get(fingerprint)
+            if evidence is not None:
+                logging.info(f"Reusing forensic verdict for {os.path.basename(file_path)}: {evidence['verdict']}")
+                return evidence
+        return self._analyze(file_path, fingerprint, declared_duration)[0]
+
+    def spectrum(self, file_path: str, is_cancelled: Optional[Callable[[], bool]] = None) -> Tuple[Dict[str, Any], Optional[bytes]]:
+        """
+        The evidence and serialized SpectralAnalysis of a file. The file is
+        only decoded if the analysis isn't stored from an earlier verdict.
+        """
+        fingerprint = self._fingerprint(file_path)
+        if fingerprint is not None:
+            evidence, spectrum = self.cache.get(fingerprint), self.cache.get_spectrum(fingerprint)
+            if evidence is not None and spectrum is not None:
+                return evidence, spectrum
+        return self._analyze(file_path, fingerprint, None, is_cancelled)
+
+    def report(self, file_path: str, output_path: str, is_cancelled: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+        """Renders the visual report of a file in a worker. Raises ForensicTaskError on failure."""
+        evidence, spectrum = self.spectrum(file_path, is_cancelled)
+        if spectrum is None:
+            raise ForensicTaskError("Failed to analyze audio for visualization.")
+        task, _ = self.submit('report', file_path, _render_report, output_path, os.path.basename(file_path), evidence, spectrum)
+        return task.result(is_cancelled)
+
+    def stored_report(self, fingerprint: str) -> Optional[Tuple[Dict[str, Any], List[Any]]]:
+        """
+        The data report of the audio with this fingerprint and its spectrogram
+        pyramid, built from the stored analysis, or None if there is none.
+        """
+        from core.forensic_report import build_report, spectrogram_pyramid
+        from core.spectral_analysis import SpectralAnalysis
+
+        with self._lock:
+            stored = self._reports.get(fingerprint)
+            if stored is not None:
+                self._reports.move_to_end(fingerprint)
+                return stored
+        evidence, data = self.cache.get(fingerprint), self.cache.get_spectrum(fingerprint)
+        if evidence is None or data is None:
+            return None
+        spectrum = SpectralAnalysis.from_bytes(data)
+        levels = spectrogram_pyramid(spectrum)
+        stored = build_report(evidence, spectrum, levels), levels
+        with self._lock:
+            self._reports[fingerprint] = stored
+            while len(self._reports) > REPORT_MEMO_ENTRIES:
+                self._reports.popitem(last=False)
+        return stored
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            active = [task.to_dict() for task in self._active.values()]
+            finished = [task.to_dict() for task in reversed(self._finished.values())]
+            counts = dict(self._counts)
+        return {
+            'workers': self.workers,
+            'timeout': self.timeout,
+            'running': sum(1 for task in active if task['status'] == 'running'),
+            'queued': sum(1 for task in active if task['status'] == 'queued'),
+            'completed': counts,
+            'active': active,
+            'recent': finished,
+            'cache': self.cache.stats(),
+        }
+
+    # --- Internals ---
+
+    @staticmethod
+    def _fingerprint(file_path: str) -> Optional[str]:
+        try:
+            return content_fingerprint(file_path)
+        except OSError as e:
+            logging.warning(f"Could not fingerprint {file_path}: {e}")
+            return None
+
+    def _analyze(self, file_path: str, fingerprint: Optional[str], declared_duration: Optional[float],
+                 is_cancelled: Optional[Callable[[], bool]] = None) -> Tuple[Dict[str, Any], Optional[bytes]]:
+        # Verdicts and reports share one analysis task per file, and only
+        # its creator may cancel it. When the creator does, the others
+        # waiting on it submit the analysis again.
+        while True:
+            task, created = self.submit('analysis', file_path, analyze_audio_spectrum, file_path, declared_duration)
+            try:
+                evidence, spectrum = task.result(is_cancelled if created else None)
+                break
+            except ForensicTaskError as e:
+                if is_cancelled is not None and is_cancelled():
+                    raise
+                if task.status == 'cancelled':
+                    continue
+                logging.warning(f"Forensic analysis of {os.path.basename(file_path)} failed: {e}")
+                return empty_evidence(declared_duration), None
+        if fingerprint is not None:
+            self.cache.set(fingerprint, evidence)
+            if spectrum is not None:
+                self.cache.set_spectrum(fingerprint, spectrum)
+        return evidence, spectrum
+
+    # --- Workers ---
+
+    def _ensure_started(self):
+        # Called with the lock held.
+        if self._started:
+            return
+        for index in range(self.workers):
+            threading.Thread(target=self._dispatch, name=f"forensics-{index}", daemon=True).start()
+        self._started = True
+
+    def _dispatch(self):
+        # Feeds queued tasks to one worker process, started on first use and
+        # replaced whenever a task has to be killed.
+        worker: Optional[_Worker] = None
+        while True:
+            task = self._queue.get()
+            with self._lock:
+                # Tasks cancelled while queued are already finished.
+                if task.status != 'queued':
+                    continue
+                task.status = 'running'
+                task.started_at = time.time()
+            try:
+                if worker is None:
+                    worker = _Worker()
+                status, value = self._run(worker, task)
+            except (OSError, EOFError) as e:
+                status, value = 'failed', f"Worker process failed: {e}"
+                worker_ok = False
+            else:
+                # A task that raised leaves its worker usable; one that was
+                # stopped midway or crashed does not.
+                worker_ok = status == 'done' or (status == 'failed' and worker.process.is_alive())
+            if not worker_ok and worker is not None:
+                worker.stop()
+                worker = None
+            self._finish(task, status, value)
+
+    def _run(self, worker: _Worker, task: ForensicTask) -> Tuple[str, Any]:
+        worker.conn.send((task.func, task.args))
+        deadline = time.monotonic() + task.timeout
+        while not worker.conn.poll(POLL_INTERVAL):
+            if task.cancelled:
+                return 'cancelled', None
+            if time.monotonic() > deadline:
+                return 'timeout', f"Timed out after {task.timeout:g}s"
+            if not worker.process.is_alive():
+                return 'failed', f"Worker process exited with code {worker.process.exitcode}"
+        ok, value = worker.conn.recv()
+        return ('done', value) if ok else ('failed', value)
+
+    def _cancel_queued(self, task: ForensicTask):
+        with self._lock:
+            if task.status != 'queued':
+                return
+            self._record_finish(task, 'cancelled')
+        task._finished.set()
+
+    def _finish(self, task: ForensicTask, status: str, value: Any = None):
+        with self._lock:
+            self._record_finish(task, status, value)
+        if status == 'timeout':
+            logging.warning(f"Forensic {task.kind} of {os.path.basename(task.file_path)} timed out after {task.timeout:g}s")
+        task._finished.set()
+
+    def _record_finish(self, task: ForensicTask, status: str, value: Any = None):
+        # Called with the lock held.
+        task.status = status
+        task.finished_at = time.time()
+        if status == 'done':
+            task.result_value = value
+        elif status != 'cancelled':
+            task.error = value
+        self._counts[status] += 1
+        key = (task.kind, task.file_path)
+        if self._active.get(key) is task:
+            del self._active[key]
+        self._finished[task.id] = task
+        while len(self._finished) > FINISHED_TASK_HISTORY:
+            self._finished.popitem(last=False)
@@ -0,0 +1,229 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+USER_AGENT = 'Sonosano/1.0.0 ( https://github.com/KRSHH/Sonosano )'
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+# Requests per second and burst size per host. Hosts match by suffix, so
+# 'musicbrainz.org' also covers 'beta.musicbrainz.org'. MusicBrainz allows
+# one request per second per client and answers 503 above that.
+HOST_RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    'musicbrainz.org': (1.0, 1),
+    'coverartarchive.org': (5.0, 5),
+    'archive.org': (5.0, 5),
+    'lrclib.net': (5.0, 5),
+    'music.apple.com': (2.0, 2),
+}
+
+RETRY_STATUSES = (429, 503)
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+MAX_RETRY_DELAY = 30.0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Callers reserve a token and get back how long to
+    wait before using it, so the same bucket serves threads (time.sleep) and
+    coroutines (asyncio.sleep).
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def penalize(self, seconds: float):
+        """Holds back every caller for `seconds`, e.g. after the host asked us to slow down."""
+        with self._lock:
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+class HttpClient:
+    """
+    Shared outbound HTTP client.
+
+    Keeps one keep-alive connection pool for threads and one per event loop
+    for coroutines, applies default timeouts, throttles each rate-limited host
+    with a token bucket shared by both, and retries 429/503 responses and
+    connection errors with jittered exponential backoff (honouring
+    Retry-After). Per-host counters are available from metrics().
+    """
+
+    def __init__(self, rate_limits: Optional[Dict[str, Tuple[float, int]]] = None,
+                 max_retries: int = MAX_RETRIES, timeout: httpx.Timeout = DEFAULT_TIMEOUT):
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._buckets = {host: TokenBucket(rate, burst) for host, (rate, burst) in (rate_limits or HOST_RATE_LIMITS).items()}
+        self._client: Optional[httpx.Client] = None
+        self._async_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    # --- Public API ---
+
+    def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        host = httpx.URL(url).host
+        for attempt in range(self.max_retries + 1):
+            self._throttle_sync(host)
+            started = time.monotonic()
+            try:
+                response = self._sync_client().request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                self._record(host, started, error=True)
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning(f"HTTP {method} {host} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            self._record(host, started, status=response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            delay = self._retry_delay(host, response, attempt)
+            logging.warning(f"HTTP {method} {host} returned {response.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url: str, **kwargs: Any) -> httpx.Response:
+        return self.request('HEAD', url, **kwargs)
+
+    async def arequest(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        host = httpx.URL(url).host
+        for attempt in range(self.max_retries + 1):
+            await self._throttle_async(host)
+            started = time.monotonic()
+            try:
+                response = await self._async_client().request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                self._record(host, started, error=True)
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning(f"HTTP {method} {host} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            self._record(host, started, status=response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            delay = self._retry_delay(host, response, attempt)
+            logging.warning(f"HTTP {method} {host} returned {response.status_code}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def aget(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.arequest('GET', url, **kwargs)
+
+    async def ahead(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.arequest('HEAD', url, **kwargs)
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """Per-host request, retry, error and wait counters."""
+        with self._lock:
+            return {host: dict(counters) for host, counters in self._metrics.items()}
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    # --- Internals ---
+
+    def _new_client_args(self) -> Dict[str, Any]:
+        return {
+            'timeout': self.timeout,
+            'follow_redirects': True,
+            'headers': {'User-Agent': USER_AGENT},
+            'limits': httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        }
+
+    def _sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(**self._new_client_args())
+            return self._client
+
+    def _async_client(self) -> httpx.AsyncClient:
+        # Async connections belong to the loop that opened them.
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                for old_loop in [old for old in self._async_clients if old.is_closed()]:
+                    del self._async_clients[old_loop]
+                client = self._async_clients[loop] = httpx.AsyncClient(**self._new_client_args())
+            return client
+
+    def _bucket(self, host: str) -> Optional[TokenBucket]:
+        for suffix, bucket in self._buckets.items():
+            if host == suffix or host.endswith('.' + suffix):
+                return bucket
+        return None
+
+    def _throttle_sync(self, host: str):
+        bucket = self._bucket(host)
+        delay = bucket.reserve() if bucket else 0.0
+        if delay > 0:
+            self._count(host, 'throttled_seconds', delay)
+            time.sleep(delay)
+
+    async def _throttle_async(self, host: str):
+        bucket = self._bucket(host)
+        delay = bucket.reserve() if bucket else 0.0
+        if delay > 0:
+            self._count(host, 'throttled_seconds', delay)
+            await asyncio.sleep(delay)
+
+    def _retry_delay(self, host: str, response: httpx.Response, attempt: int) -> float:
+        self._count(host, 'retries')
+        delay = self._backoff(attempt)
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), MAX_RETRY_DELAY))
+        bucket = self._bucket(host)
+        if bucket:
+            # Slow down every caller of this host, not just this request.
+            bucket.penalize(delay)
+        return delay
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return min(MAX_RETRY_DELAY, RETRY_BACKOFF * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def _count(self, host: str, name: str, amount: float = 1):
+        with self._lock:
+            self._metrics[host][name] += amount
+
+    def _record(self, host: str, started: float, status: Optional[int] = None, error: bool = False):
+        with self._lock:
+            counters = self._metrics[host]
+            counters['requests'] += 1
+            counters['seconds'] += time.monotonic() - started
+            if error:
+                counters['errors'] += 1
+            else:
+                counters[f"status_{status}"] += 1
+
+
+http_client = HttpClient()
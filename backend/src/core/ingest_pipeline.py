@@ -0,0 +1,408 @@
+import os
+import uuid
+import queue
+import itertools
+import threading
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Iterable, TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from core.song_processor import SongProcessor
+    from core.job_manager import Job
+
+STAGES = ('extract', 'enrich', 'analyze', 'commit')
+
+# Lower values are processed first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# How many finished jobs are kept for status lookups.
+FINISHED_JOB_HISTORY = 500
+
+
+class IngestBatch:
+    """Tracks completion of a group of files submitted together."""
+
+    def __init__(self, total: int):
+        self.total = total
+        # Files finished in any way; the other counters break them down.
+        self.done = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.skipped = 0
+        self._condition = threading.Condition()
+
+    @property
+    def processed(self) -> int:
+        """Files whose song record was committed."""
+        return self.done - self.failed - self.cancelled - self.skipped
+
+    def finish(self, status: str):
+        """Counts one file as finished with its ProcessingJob status."""
+        with self._condition:
+            self.done += 1
+            if status == 'failed':
+                self.failed += 1
+            elif status == 'cancelled':
+                self.cancelled += 1
+            elif status == 'skipped':
+                self.skipped += 1
+            self._condition.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        with self._condition:
+            return self._condition.wait_for(lambda: self.done >= self.total, timeout)
+
+    def truncate(self, total: int):
+        """Lowers the expected total when submission stopped early."""
+        with self._condition:
+            self.total = total
+            self._condition.notify_all()
+
+
+@dataclass
+class ProcessingJob:
+    """A queued request to process one file. Duplicate requests share the same job."""
+    file_path: str
+    priority: int
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = 'queued'  # queued, processing, done, failed, skipped, cancelled
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    metadata: Optional[Dict[str, Any]] = None
+    # Metadata of the search result a download came from, merged during extraction.
+    search_metadata: Optional[Dict[str, Any]] = None
+    batches: List[IngestBatch] = field(default_factory=list)
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'file_path': self.file_path,
+            'priority': 'interactive' if self.priority < PRIORITY_BACKGROUND else 'background',
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class IngestPipeline:
+    """
+    Staged, parallel version of SongProcessor.process_new_song.
+
+    Files flow through local tag extraction, network enrichment, audio
+    analysis and a batched database commit. Every stage has its own worker
+    count and a priority inbox: interactive jobs (a user clicking reprocess,
+    a finished download) overtake bulk sync work at every stage. Stage inboxes
+    are bounded and bulk submissions wait for free queue slots, so a large
+    import back-pressures instead of piling up in memory. The stages call the
+    same SongProcessor methods as the serial path, so the stored records match.
+    Audio analysis is CPU bound and runs in the ForensicService worker processes.
+    """
+
+    def __init__(self, song_processor: 'SongProcessor', extract_workers: int = 2, enrich_workers: int = 4,
+                 analysis_workers: Optional[int] = None, queue_size: int = 16,
+                 commit_batch_size: int = 25, commit_interval: float = 1.0):
+        self.song_processor = song_processor
+        self.extract_workers = extract_workers
+        self.enrich_workers = enrich_workers
+        self.analysis_workers = analysis_workers or max(1, min(4, (os.cpu_count() or 2) // 2))
+        self.queue_size = queue_size
+        self.commit_batch_size = commit_batch_size
+        self.commit_interval = commit_interval
+
+        # The extract inbox is unbounded so interactive jobs never block;
+        # bulk jobs are admitted through _queued_background instead.
+        self._inboxes = {
+            stage: queue.PriorityQueue(maxsize=0 if stage == 'extract' else queue_size) for stage in STAGES
+        }
+        self._sequence = itertools.count()
+        self._start_lock = threading.Lock()
+        self._started = False
+
+        self._jobs_lock = threading.Condition()
+        self._active_jobs: Dict[str, ProcessingJob] = {}
+        self._finished_jobs: 'OrderedDict[str, ProcessingJob]' = OrderedDict()
+        self._last_done: 'OrderedDict[str, ProcessingJob]' = OrderedDict()
+        self._queued_background = 0
+
+        self._completed = {stage: 0 for stage in STAGES}
+        self._submitted = 0
+        self._failed = 0
+        self._skipped = 0
+        self._cancelled = 0
+
+    # --- Public API ---
+
+    def submit(self, file_path: str, priority: int = PRIORITY_BACKGROUND,
+               batch: Optional[IngestBatch] = None, done_since: Optional[float] = None,
+               search_metadata: Optional[Dict[str, Any]] = None) -> ProcessingJob:
+        """
+        Queues a file for processing and returns its job. A file that is already
+        queued or processing returns the existing job; queued jobs are moved up
+        if the new request has a higher priority. With `done_since`, a file that
+        was successfully processed after that time is not queued again. Bulk
+        submissions block while the queue is full.
+        """
+        self._ensure_started()
+        with self._jobs_lock:
+            job = self._active_jobs.get(file_path)
+            if job is None and priority >= PRIORITY_BACKGROUND:
+                self._jobs_lock.wait_for(lambda: self._queued_background < self.queue_size)
+                job = self._active_jobs.get(file_path)
+
+            if job is None and done_since is not None:
+                last_done = self._last_done.get(file_path)
+                if last_done is not None and last_done.finished_at >= done_since:
+                    if batch:
+                        batch.finish('done')
+                    return last_done
+
+            if job is not None:
+                if batch:
+                    job.batches.append(batch)
+                if search_metadata and job.status == 'queued':
+                    job.search_metadata = search_metadata
+                if job.status == 'queued' and priority < job.priority:
+                    if job.priority >= PRIORITY_BACKGROUND:
+                        self._queued_background -= 1
+                        self._jobs_lock.notify_all()
+                    job.priority = priority
+                    # The old queue entry is skipped when popped, since the job is no longer queued by then.
+                    self._inboxes['extract'].put((priority, next(self._sequence), job))
+                return job
+
+            job = ProcessingJob(file_path, priority, search_metadata=search_metadata, batches=[batch] if batch else [])
+            if not self.song_processor._claim(file_path):
+                # Being processed outside the pipeline by process_new_song.
+                logging.info(f"Already processing {file_path}, skipping.")
+                self._finish_job(job, 'skipped')
+                return job
+
+            self._active_jobs[file_path] = job
+            self._submitted += 1
+            if priority >= PRIORITY_BACKGROUND:
+                self._queued_background += 1
+            self._inboxes['extract'].put((priority, next(self._sequence), job))
+            return job
+
+    def run(self, file_paths: Iterable[str], priority: int = PRIORITY_BACKGROUND,
+            job: Optional['Job'] = None) -> IngestBatch:
+        """
+        Processes the files and blocks until all of them are committed or failed.
+        With a job, progress is reported on it, and cancelling the job stops
+        submitting files and drops those of this batch that are still queued.
+        """
+        file_paths = list(file_paths)
+        batch = IngestBatch(len(file_paths))
+        started = time.time()
+        submitted: List[ProcessingJob] = []
+        for file_path in file_paths:
+            if job is not None and job.cancelled:
+                batch.truncate(len(submitted))
+                break
+            # Files that an interactive job finished while this batch was queued are not redone.
+            submitted.append(self.submit(file_path, priority, batch, done_since=started))
+
+        while not batch.wait(0.5 if job is not None else None):
+            job.update(done=batch.done)
+            if job.cancelled:
+                for processing_job in submitted:
+                    self.cancel(processing_job, batch)
+        if job is not None:
+            job.update(done=batch.done)
+        logging.info(f"Ingested {batch.processed}/{batch.total} files in {time.time() - started:.1f}s"
+                     f" ({batch.failed} failed, {batch.cancelled} cancelled, {batch.skipped} skipped)")
+        return batch
+
+    def cancel(self, job: ProcessingJob, batch: Optional[IngestBatch] = None) -> bool:
+        """
+        Drops a job that has not started yet. Jobs that other callers are also
+        waiting on (a different batch, or an interactive request) are kept.
+        """
+        with self._jobs_lock:
+            if job.status != 'queued' or any(other is not batch for other in job.batches):
+                return False
+            if batch is not None and job.priority < PRIORITY_BACKGROUND:
+                return False
+            if job.priority >= PRIORITY_BACKGROUND:
+                self._queued_background -= 1
+                self._jobs_lock.notify_all()
+            self._finish_job(job, 'cancelled')
+            return True
+
+    def get_job(self, job_id: str) -> Optional[ProcessingJob]:
+        with self._jobs_lock:
+            for job in self._active_jobs.values():
+                if job.id == job_id:
+                    return job
+            return self._finished_jobs.get(job_id)
+
+    def progress(self) -> Dict[str, Any]:
+        with self._jobs_lock:
+            return {
+                'submitted': self._submitted,
+                'completed': dict(self._completed),
+                'failed': self._failed,
+                'skipped': self._skipped,
+                'cancelled': self._cancelled,
+                'in_flight': len(self._active_jobs),
+                'queued_background': self._queued_background,
+                'queued': {stage: inbox.qsize() for stage, inbox in self._inboxes.items()},
+            }
+
+    # --- Workers ---
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._started:
+                return
+            workers = {
+                'extract': (self.extract_workers, self._extract),
+                'enrich': (self.enrich_workers, self._enrich),
+                'analyze': (self.analysis_workers, self._analyze),
+            }
+            for stage, (count, handler) in workers.items():
+                for index in range(count):
+                    threading.Thread(
+                        target=self._stage_worker, args=(stage, handler), name=f"ingest-{stage}-{index}", daemon=True
+                    ).start()
+            threading.Thread(target=self._commit_worker, name="ingest-commit", daemon=True).start()
+            self._started = True
+
+    def _stage_worker(self, stage: str, handler):
+        inbox = self._inboxes[stage]
+        while True:
+            priority, _sequence, job = inbox.get()
+            if stage == 'extract' and not self._start_job(job):
+                continue
+            try:
+                next_stage = handler(job)
+            except Exception as e:
+                logging.error(f"Ingest {stage} failed for {job.file_path}: {e}", exc_info=True)
+                self._finish_job(job, 'failed', str(e))
+                continue
+
+            self._count(stage)
+            if next_stage is None:
+                self._finish_job(job, 'skipped')
+            else:
+                self._inboxes[next_stage].put((priority, next(self._sequence), job))
+
+    def _start_job(self, job: ProcessingJob) -> bool:
+        with self._jobs_lock:
+            if job.status != 'queued':
+                return False
+            job.status = 'processing'
+            job.started_at = time.time()
+            if job.priority >= PRIORITY_BACKGROUND:
+                self._queued_background -= 1
+                self._jobs_lock.notify_all()
+            return True
+
+    def _extract(self, job: ProcessingJob) -> Optional[str]:
+        job.metadata = self.song_processor._extract_metadata(job.file_path, job.search_metadata)
+        return 'enrich' if job.metadata is not None else None
+
+    def _enrich(self, job: ProcessingJob) -> str:
+        self.song_processor._enrich_metadata(job.file_path, job.metadata)
+        return 'analyze' if self.song_processor.needs_analysis(job.file_path) else 'commit'
+
+    def _analyze(self, job: ProcessingJob) -> str:
+        evidence = self.song_processor.forensics.evidence(job.file_path, self.song_processor.declared_duration(job.file_path))
+        self.song_processor._apply_analysis_verdict(job.file_path, job.metadata, evidence['verdict'])
+        return 'commit'
+
+    def _commit_worker(self):
+        inbox = self._inboxes['commit']
+        while True:
+            priority, _sequence, job = inbox.get()
+            jobs = [job]
+            # Interactive jobs are committed right away instead of waiting for a full batch.
+            deadline = time.monotonic() + (0 if priority < PRIORITY_BACKGROUND else self.commit_interval)
+            while len(jobs) < self.commit_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    priority, _sequence, job = inbox.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                jobs.append(job)
+                if priority < PRIORITY_BACKGROUND:
+                    break
+            self._commit(jobs)
+
+    def _commit(self, jobs: List[ProcessingJob]):
+        records, entries, ready = [], [], []
+        for job in jobs:
+            try:
+                song_data, entry = self.song_processor._build_song_record(job.file_path, job.metadata)
+            except OSError as e:
+                logging.warning(f"File disappeared before commit: {job.file_path}: {e}")
+                self._finish_job(job, 'failed', str(e))
+                continue
+            records.append(song_data)
+            if entry:
+                entries.append(entry)
+            ready.append(job)
+
+        if not ready:
+            return
+        try:
+            self.song_processor.library_service.add_or_update_songs(records, manifest_entries=entries)
+        except Exception as e:
+            logging.error(f"Ingest commit of {len(ready)} songs failed: {e}", exc_info=True)
+            for job in ready:
+                self._finish_job(job, 'failed', str(e))
+            return
+
+        for job in ready:
+            self._count('commit')
+            self._finish_job(job, 'done')
+
+    # --- Bookkeeping ---
+
+    def _count(self, stage: str):
+        with self._jobs_lock:
+            self._completed[stage] += 1
+
+    def _finish_job(self, job: ProcessingJob, status: str, error: Optional[str] = None):
+        with self._jobs_lock:
+            if self._active_jobs.get(job.file_path) is job:
+                del self._active_jobs[job.file_path]
+                self.song_processor._release(job.file_path)
+            job.status = status
+            job.error = error
+            job.finished_at = time.time()
+            job.metadata = None
+            job.search_metadata = None
+            if status == 'failed':
+                self._failed += 1
+            elif status == 'skipped':
+                self._skipped += 1
+            elif status == 'cancelled':
+                self._cancelled += 1
+            self._finished_jobs[job.id] = job
+            while len(self._finished_jobs) > FINISHED_JOB_HISTORY:
+                self._finished_jobs.popitem(last=False)
+            if status == 'done':
+                self._last_done.pop(job.file_path, None)
+                self._last_done[job.file_path] = job
+                while len(self._last_done) > FINISHED_JOB_HISTORY:
+                    self._last_done.popitem(last=False)
+            batches, job.batches = job.batches, []
+        job._done.set()
+        for batch in batches:
+            batch.finish(status)
@@ -0,0 +1,179 @@
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# How many jobs of each type may run at once; further jobs wait queued.
+JOB_LIMITS: Dict[str, int] = {
+    'library_sync': 1,
+    'song_process': 4,
+    'forensics': 2,
+}
+
+# How many finished jobs are kept for later retrieval.
+FINISHED_JOB_HISTORY = 200
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function to stop early after a cancellation request."""
+
+
+@dataclass
+class Job:
+    """A long-running operation started by an API request."""
+    type: str
+    key: Optional[str] = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = 'queued'  # queued, running, done, failed, cancelled
+    done: int = 0
+    total: Optional[int] = None
+    message: Optional[str] = None
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+    _finished: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    def update(self, done: Optional[int] = None, total: Optional[int] = None, message: Optional[str] = None):
+        """Reports progress from inside the job function."""
+        if done is not None:
+            self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'type': self.type,
+            'status': self.status,
+            'progress': {'done': self.done, 'total': self.total, 'message': self.message},
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'url': f"/jobs/{self.id}",
+        }
+
+
+class JobManager:
+    """
+    Runs long library operations in the background and keeps track of them.
+
+    Every job type has its own worker pool sized by JOB_LIMITS, so e.g. only
+    one library sync runs at a time while forensic reports have their own
+    slots. Jobs submitted with a key are deduplicated: while a job with the
+    same type and key is queued or running, submitting again returns it.
+    Cancellation is cooperative; job functions check `job.cancelled`.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, history: int = FINISHED_JOB_HISTORY):
+        self.limits = limits or JOB_LIMITS
+        self.history = history
+        self._lock = threading.Lock()
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._active: Dict[Tuple[str, str], Job] = {}
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+
+    def submit(self, job_type: str, func: Callable[[Job], Any], key: Optional[str] = None) -> Tuple[Job, bool]:
+        """
+        Starts `func(job)` in the background. Its return value becomes the job
+        result. Returns the job and whether it was newly created.
+        """
+        with self._lock:
+            if key is not None:
+                existing = self._active.get((job_type, key))
+                if existing is not None:
+                    return existing, False
+
+            job = Job(job_type, key)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._active[(job_type, key)] = job
+            self._prune()
+
+            executor = self._executors.get(job_type)
+            if executor is None:
+                executor = self._executors[job_type] = ThreadPoolExecutor(
+                    max_workers=self.limits.get(job_type, 1), thread_name_prefix=f"job-{job_type}"
+                )
+        executor.submit(self._run, job, func)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, job_type: Optional[str] = None) -> List[Job]:
+        with self._lock:
+            return [job for job in self._jobs.values() if job_type is None or job.type == job_type]
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Requests cancellation. Queued jobs never start; running jobs stop at their next check."""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        job._cancel.set()
+        with self._lock:
+            if job.status == 'queued':
+                self._finish(job, 'cancelled')
+        return job
+
+    def _run(self, job: Job, func: Callable[[Job], Any]):
+        with self._lock:
+            if job.status != 'queued':
+                return
+            job.status = 'running'
+            job.started_at = time.time()
+
+        try:
+            result = func(job)
+        except JobCancelled:
+            status, result, error = 'cancelled', None, None
+        except Exception as e:
+            logging.error(f"Job {job.type} {job.id} failed: {e}", exc_info=True)
+            status, result, error = 'failed', None, str(e)
+        else:
+            status, error = ('cancelled' if job.cancelled else 'done'), None
+
+        with self._lock:
+            job.result = result
+            job.error = error
+            self._finish(job, status)
+
+    def _finish(self, job: Job, status: str):
+        # Called with the lock held.
+        job.status = status
+        job.finished_at = time.time()
+        if job.key is not None and self._active.get((job.type, job.key)) is job:
+            del self._active[(job.type, job.key)]
+        job._finished.set()
+
+    def _prune(self):
+        # Called with the lock held. Drops the oldest finished jobs beyond the history size.
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
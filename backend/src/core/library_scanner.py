@@ -0,0 +1,119 @@
+import os
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import List, Iterator, Tuple, Optional
+
+from utils.file_system_utils import AUDIO_EXTENSIONS
+from .library_service import LibraryService
+
+# (relative path, size, mtime_ns, inode)
+ManifestEntry = Tuple[str, int, int, int]
+
+
+def manifest_entry(file_path: str, music_directory: str) -> Optional[ManifestEntry]:
+    """Builds the manifest entry for a single file, or None if it no longer exists."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return os.path.relpath(file_path, music_directory), stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+@dataclass
+class SyncPlan:
+    """The result of comparing the music directory against the stored manifest."""
+    to_process: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    adopted: List[ManifestEntry] = field(default_factory=list)
+    new: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    duration: float = 0.0
+
+
+class LibraryScanner:
+    """
+    Finds library files that changed since the last sync.
+
+    The music directory is walked once with os.scandir and each file's
+    (size, mtime, inode) is compared against the manifest stored with the
+    library, so an unchanged tree costs one stat per file and no processing.
+    """
+
+    def __init__(self, library_service: LibraryService):
+        self.library_service = library_service
+
+    def walk(self, music_directory: str) -> Iterator[Tuple[str, os.DirEntry]]:
+        """Yields (relative path, entry) for every audio file below the music directory."""
+        # Relative paths are sliced off the entry path; os.path.relpath is too slow per file.
+        root = os.path.join(music_directory, '')
+        stack = [music_directory]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        # Hidden entries are skipped, as the recursive glob did.
+                        if entry.name.startswith('.'):
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.name.lower().endswith(AUDIO_EXTENSIONS) and entry.is_file():
+                                yield entry.path[len(root):], entry
+                        except OSError as e:
+                            logging.warning(f"Sync: Could not read {entry.path}: {e}")
+            except OSError as e:
+                logging.warning(f"Sync: Could not scan {directory}: {e}")
+
+    def plan(self, music_directory: str) -> SyncPlan:
+        """Compares the music directory against the manifest without changing anything."""
+        started = time.monotonic()
+        plan = SyncPlan()
+        manifest = self.library_service.get_manifest()
+        song_paths = self.library_service.get_song_paths()
+        seen = set()
+
+        for relative_path, entry in self.walk(music_directory):
+            seen.add(relative_path)
+            try:
+                stat = entry.stat()
+                current = (stat.st_size, stat.st_mtime_ns, entry.inode())
+            except OSError:
+                continue
+
+            known = manifest.get(relative_path)
+            if known == current:
+                plan.unchanged += 1
+            elif known is None and relative_path in song_paths:
+                # Already in the library from before the manifest existed: record it, don't reprocess.
+                plan.adopted.append((relative_path, *current))
+                plan.unchanged += 1
+            else:
+                if known is None:
+                    plan.new += 1
+                else:
+                    plan.changed += 1
+                plan.to_process.append(entry.path)
+
+        # Sorted so tracks of the same folder are processed together.
+        plan.to_process.sort()
+        plan.removed = [path for path in song_paths | manifest.keys() if path not in seen]
+        plan.duration = time.monotonic() - started
+        return plan
+
+    def sync(self, music_directory: str) -> SyncPlan:
+        """
+        Scans the music directory and applies removals and manifest updates in a
+        single transaction. New and changed files are returned in `to_process`;
+        their manifest entries are written when their song record is committed.
+        """
+        plan = self.plan(music_directory)
+        if plan.removed or plan.adopted:
+            self.library_service.apply_sync_diff(plan.removed, plan.adopted)
+        logging.info(
+            f"Sync scanned {music_directory} in {plan.duration:.2f}s: {plan.new} new, {plan.changed} changed, "
+            f"{len(plan.removed)} deleted, {plan.unchanged} unchanged."
+        )
+        return plan
@@ -1,111 +1,301 @@
 import os
+import re
 import json
-import glob
-import sys
-import threading
-from typing import List, Dict, Any
-from tinydb import TinyDB, Query
+import base64
+from typing import List, Dict, Any, Optional, Tuple, Set
+from .library_store import LibraryStore
+from .change_feed import (
+    ChangeFeed, SONG_ADDED, SONG_UPDATED, SONG_REMOVED, SONG_MOVED, LYRICS_CACHED, PLAYLIST_CHANGED, PLAYLIST_DELETED
+)
 from .metadata_service import MetadataService
 from pynicotine.config import config
 from models.playlist_models import Playlist
 from datetime import datetime
 import logging
 
+SONG_SORT_COLUMNS = ('path', 'title', 'artist', 'album', 'date_added')
+_FIELD_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$')
+
+
+def _encode_cursor(sort_value: Any, path: str) -> str:
+    raw = json.dumps([sort_value, path]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, path = json.loads(base64.urlsafe_b64decode(padded))
+        return sort_value, path
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+
+
+def _projection_sql(fields: List[str]) -> Tuple[str, List[Any]]:
+    """
+    Builds a json_object() expression that only extracts the requested
+    (possibly dotted) fields, so heavy documents are never parsed in Python.
+    """
+    tree: Dict[str, Any] = {}
+    for field in fields:
+        if not _FIELD_PATTERN.match(field):
+            raise ValueError(f"Invalid field: {field}")
+        node = tree
+        parts = field.split('.')
+        for part in parts[:-1]:
+            child = node.setdefault(part, {})
+            if child is None:
+                break
+            node = child
+        else:
+            node[parts[-1]] = None
+
+    def build(node: Dict[str, Any], prefix: str) -> Tuple[str, List[Any]]:
+        args, params = [], []
+        for key, child in node.items():
+            path = f"{prefix}.{key}"
+            if child is None:
+                args.append("?, json_extract(data, ?)")
+                params += [key, path]
+            else:
+                sub_sql, sub_params = build(child, path)
+                args.append(f"?, {sub_sql}")
+                params += [key] + sub_params
+        return f"json_object({', '.join(args)})", params
+
+    return build(tree, '$')
+
+
 class LibraryService:
     def __init__(self, metadata_service: MetadataService, data_path: str):
         self.metadata_service = metadata_service
         self.data_path = data_path
-        db_path = os.path.join(data_path, 'library.db')
+        db_path = os.path.join(data_path, 'library.sqlite3')
         logging.info(f"Initializing database at: {db_path}")
-        self.db_lock = threading.Lock()
-        
-        # Ensure the db file is not empty
-        if not os.path.exists(db_path) or os.path.getsize(db_path) == 0:
-            with open(db_path, 'w') as f:
-                f.write('{}')
-
-        self.db = TinyDB(db_path)
-        self.songs_table = self.db.table('songs')
-        self.lyrics_table = self.db.table('lyrics')
-        self.playlists_table = self.db.table('playlists')
-        self.download_metadata = {}
+        self.music_directory = os.path.join(data_path, 'downloads')
+        self.store = LibraryStore(db_path)
+
+        # Import the old TinyDB database once; it is renamed after a successful import.
+        self.store.import_tinydb(os.path.join(data_path, 'library.db'))
+        self.changes = ChangeFeed(self.store)
 
     def get_all_songs(self) -> List[Dict]:
-        with self.db_lock:
-            return self.songs_table.all()
+        return self.store.all('songs')
+
+    def get_library_version(self) -> int:
+        return self.store.version()
+
+    def get_songs_page(self, limit: Optional[int] = None, after: Optional[str] = None, sort: str = 'path',
+                       descending: bool = False, fields: Optional[List[str]] = None) -> Tuple[List[str], Optional[str]]:
+        """
+        Returns one page of songs as JSON-encoded strings plus the cursor for the
+        next page (None on the last page). Pages are keyset-paginated on the
+        indexed sort column with the unique path as tie-breaker.
+        """
+        if sort not in SONG_SORT_COLUMNS:
+            raise ValueError(f"Unsupported sort column: {sort}")
+
+        select_sql, params = _projection_sql(fields) if fields else ("data", [])
+        direction = "DESC" if descending else "ASC"
+        where_sql = ""
+        if after:
+            sort_value, path = _decode_cursor(after)
+            operator = "<" if descending else ">"
+            if sort == 'path':
+                where_sql = f"WHERE path {operator} ?"
+                params.append(path)
+            else:
+                where_sql = f"WHERE ({sort}, path) {operator} (?, ?)"
+                params += [sort_value, path]
+        order_sql = f"ORDER BY path {direction}" if sort == 'path' else f"ORDER BY {sort} {direction}, path {direction}"
+        limit_sql = ""
+        if limit:
+            limit_sql = "LIMIT ?"
+            params.append(limit + 1)
+
+        rows = self.store.fetch(f"SELECT {select_sql}, {sort}, path FROM songs {where_sql} {order_sql} {limit_sql}", params)
+        next_cursor = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1][1], rows[-1][2])
+        return [row[0] for row in rows], next_cursor
+
+    def get_song(self, file_path: str) -> Optional[Dict]:
+        return self.store.get('songs', file_path)
 
     def add_or_update_song(self, song_data: Dict):
-        with self.db_lock:
-            self.songs_table.upsert(song_data, Query().path == song_data['path'])
+        self.add_or_update_songs([song_data])
+
+    def add_or_update_songs(self, songs: List[Dict], manifest_entries: Optional[List[Tuple[str, int, int, int]]] = None):
+        """
+        Upserts a batch of songs in a single transaction. Manifest entries for
+        the processed files are stored in the same transaction, so a file is
+        only marked as synced once its song record is committed. The search
+        metadata of downloads among them has been merged in and is dropped.
+        """
+        with self.store.transaction():
+            for song, created in self.store.upsert_many('songs', songs):
+                self.store.record_change(SONG_ADDED if created else SONG_UPDATED, song['path'], song)
+            if manifest_entries:
+                self.store.set_manifest_entries(manifest_entries)
+            self.store.remove_download_metadata_for_files(self._absolute(song['path']) for song in songs)
 
     def remove_song(self, file_path: str):
-        with self.db_lock:
-            self.songs_table.remove(Query().path == file_path)
+        self.remove_songs([file_path])
+
+    def remove_songs(self, file_paths: List[str]):
+        """Removes a batch of songs in a single transaction."""
+        with self.store.transaction():
+            for path in self.store.remove_many('songs', file_paths):
+                self.store.record_change(SONG_REMOVED, path)
+            self.store.remove_manifest_entries(file_paths)
+
+    def rename_song(self, old_path: str, new_path: str) -> bool:
+        """
+        Moves a song record to a new relative path, keeping its metadata, cached
+        lyrics, manifest entry and playlist memberships. Returns False if there
+        is no song at the old path.
+        """
+        with self.store.transaction():
+            if old_path == new_path:
+                return False
+            # Files still waiting to be ingested have no song yet but may have download metadata.
+            self.store.rename_download_files(self._absolute(old_path), self._absolute(new_path))
+            if not self.store.get('songs', old_path):
+                return False
+            self.store.remove('songs', new_path)
+            song = self.store.update('songs', old_path, {'path': new_path})
+            self.store.rename_manifest_entry(old_path, new_path)
+
+            old_lyrics_key = os.path.join(self.music_directory, old_path)
+            new_lyrics_key = os.path.join(self.music_directory, new_path)
+            if self.store.get('lyrics', old_lyrics_key):
+                self.store.remove('lyrics', new_lyrics_key)
+                self.store.update('lyrics', old_lyrics_key, {'file_path': new_lyrics_key})
+
+            for playlist_data in self.store.all('playlists'):
+                if old_path in playlist_data.get('songs', []):
+                    songs = [new_path if path == old_path else path for path in playlist_data['songs']]
+                    playlist = self.store.update('playlists', playlist_data['id'], {'songs': songs})
+                    self.store.record_change(PLAYLIST_CHANGED, playlist_data['id'], playlist)
+
+            self.store.record_change(SONG_MOVED, new_path, {'from': old_path, 'song': song})
+            return True
+
+    def rename_songs_in_directory(self, old_directory: str, new_directory: str) -> int:
+        """Moves every song below a relative directory, for folder renames. Returns the number moved."""
+        prefix = os.path.join(old_directory, '')
+        with self.store.transaction():
+            self.store.rename_download_files(self._absolute(old_directory), self._absolute(new_directory))
+            moved = 0
+            for path in self.store.keys('songs'):
+                if path.startswith(prefix):
+                    moved += self.rename_song(path, os.path.join(new_directory, path[len(prefix):]))
+            return moved
+
+    def _absolute(self, path: str) -> str:
+        # Download metadata is keyed by absolute path, songs by path relative to the music directory.
+        return os.path.abspath(os.path.join(self.music_directory, path))
+
+    def get_song_paths(self) -> Set[str]:
+        return set(self.store.keys('songs'))
+
+    def get_manifest(self) -> Dict[str, Tuple[int, int, int]]:
+        return self.store.manifest()
+
+    def get_manifest_entry(self, file_path: str) -> Optional[Tuple[int, int, int]]:
+        return self.store.manifest_entry(file_path)
+
+    def apply_sync_diff(self, removed_paths: List[str], manifest_entries: List[Tuple[str, int, int, int]]):
+        """Applies the removals and manifest updates of a library scan as one transaction."""
+        with self.store.transaction():
+            self.remove_songs(removed_paths)
+            self.store.set_manifest_entries(manifest_entries)
 
     def get_lyrics(self, file_path: str):
-        with self.db_lock:
-            return self.lyrics_table.get(Query().file_path == file_path)
+        return self.store.get('lyrics', file_path)
 
     def upsert_lyrics(self, lyrics_data: Dict, file_path: str):
-        with self.db_lock:
-            self.lyrics_table.upsert(lyrics_data, Query().file_path == file_path)
+        with self.store.transaction():
+            if self.store.upsert('lyrics', {**lyrics_data, 'file_path': file_path}):
+                self.store.record_change(LYRICS_CACHED, file_path)
+
+    @staticmethod
+    def transfer_key(username: str, virtual_path: str) -> str:
+        """Identifies a Soulseek transfer; pynicotine resumes transfers by user and path after a restart."""
+        return f"{username}:{virtual_path}"
 
-    def add_download_metadata(self, filename: str, metadata: Dict[str, Any]):
+    def add_download_metadata(self, username: str, virtual_path: str, metadata: Dict[str, Any]):
         """
-        Stores metadata for a file that is being downloaded.
-        This data is persisted and used later by the SongProcessor.
+        Stores the search metadata of a file that is being downloaded, so the
+        SongProcessor can use it once the transfer finishes, even after a
+        restart. Entries expire after DOWNLOAD_METADATA_TTL.
         """
-        # The key for the metadata dictionary is the simple filename.
-        self.download_metadata[filename] = metadata
-        logging.info(f"Stored download-time metadata for '{filename}'")
+        key = self.transfer_key(username, virtual_path)
+        self.store.put_download_metadata(key, metadata)
+        logging.info(f"Stored download-time metadata for '{key}'")
+
+    def attach_download_file(self, username: str, virtual_path: str, file_path: str) -> Optional[Dict[str, Any]]:
+        """Links a finished download to its local file and returns its search metadata."""
+        return self.store.attach_download_file(self.transfer_key(username, virtual_path), os.path.abspath(file_path))
+
+    def get_download_metadata(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """Search metadata of the download that produced a file, if it came from one."""
+        return self.store.download_metadata_for_file(os.path.abspath(file_path))
+
+    def remove_download_metadata(self, username: str, virtual_path: str):
+        self.store.remove_download_metadata(self.transfer_key(username, virtual_path))
 
     def create_playlist(self, playlist: Playlist) -> Playlist:
-        with self.db_lock:
-            self.playlists_table.insert(playlist.dict())
-            return playlist
+        with self.store.transaction():
+            self.store.upsert('playlists', playlist.dict())
+            self.store.record_change(PLAYLIST_CHANGED, playlist.id, playlist.dict())
+        return playlist
 
     def get_all_playlists(self) -> List[Playlist]:
-        with self.db_lock:
-            return [Playlist(**p) for p in self.playlists_table.all()]
+        return [Playlist(**p) for p in self.store.all('playlists')]
 
     def get_playlist(self, playlist_id: str) -> Playlist:
-        with self.db_lock:
-            data = self.playlists_table.get(Query().id == playlist_id)
-            return Playlist(**data) if data else None
+        data = self.store.get('playlists', playlist_id)
+        return Playlist(**data) if data else None
 
     def update_playlist(self, playlist_id: str, updates: Dict[str, Any]) -> Playlist:
-        with self.db_lock:
-            updates['updatedAt'] = datetime.utcnow().isoformat()
-            self.playlists_table.update(updates, Query().id == playlist_id)
-            data = self.playlists_table.get(Query().id == playlist_id)
-            return Playlist(**data) if data else None
+        updates['updatedAt'] = datetime.utcnow().isoformat()
+        with self.store.transaction():
+            data = self.store.update('playlists', playlist_id, updates)
+            if data:
+                self.store.record_change(PLAYLIST_CHANGED, playlist_id, data)
+        return Playlist(**data) if data else None
 
     def delete_playlist(self, playlist_id: str):
-        with self.db_lock:
-            self.playlists_table.remove(Query().id == playlist_id)
+        with self.store.transaction():
+            if self.store.remove('playlists', playlist_id):
+                self.store.record_change(PLAYLIST_DELETED, playlist_id)
 
     def add_song_to_playlist(self, playlist_id: str, song_path: str) -> Playlist:
-        with self.db_lock:
-            playlist_data = self.playlists_table.get(Query().id == playlist_id)
+        with self.store.transaction():
+            playlist_data = self.store.get('playlists', playlist_id)
             if playlist_data:
                 playlist = Playlist(**playlist_data)
                 if song_path not in playlist.songs:
                     playlist.songs.append(song_path)
                     playlist.updatedAt = datetime.utcnow().isoformat()
-                    self.playlists_table.update(playlist.dict(), Query().id == playlist_id)
-                
+                    self.store.upsert('playlists', playlist.dict())
+                    self.store.record_change(PLAYLIST_CHANGED, playlist_id, playlist.dict())
+
                 return playlist
             return None
 
     def remove_song_from_playlist(self, playlist_id: str, song_path: str) -> Playlist:
-        with self.db_lock:
-            playlist_data = self.playlists_table.get(Query().id == playlist_id)
+        with self.store.transaction():
+            playlist_data = self.store.get('playlists', playlist_id)
             if playlist_data:
                 playlist = Playlist(**playlist_data)
                 if song_path in playlist.songs:
                     playlist.songs.remove(song_path)
                     playlist.updatedAt = datetime.utcnow().isoformat()
-                    self.playlists_table.update(playlist.dict(), Query().id == playlist_id)
-                
+                    self.store.upsert('playlists', playlist.dict())
+                    self.store.record_change(PLAYLIST_CHANGED, playlist_id, playlist.dict())
+
                 return playlist
             return None
@@ -0,0 +1,399 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Callable, Tuple
+
+# Each entry upgrades the schema by one version. Never edit a shipped entry,
+# append a new one instead; the current version is kept in PRAGMA user_version.
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS songs (
+        path TEXT NOT NULL,
+        data TEXT NOT NULL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_songs_path ON songs(path);
+
+    CREATE TABLE IF NOT EXISTS lyrics (
+        file_path TEXT NOT NULL,
+        data TEXT NOT NULL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_lyrics_file_path ON lyrics(file_path);
+
+    CREATE TABLE IF NOT EXISTS playlists (
+        id TEXT NOT NULL,
+        data TEXT NOT NULL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_playlists_id ON playlists(id);
+    """,
+    """
+    ALTER TABLE songs ADD COLUMN title TEXT COLLATE NOCASE
+        GENERATED ALWAYS AS (COALESCE(json_extract(data, '$.metadata.title'), '')) VIRTUAL;
+    ALTER TABLE songs ADD COLUMN artist TEXT COLLATE NOCASE
+        GENERATED ALWAYS AS (COALESCE(json_extract(data, '$.metadata.artist'), '')) VIRTUAL;
+    ALTER TABLE songs ADD COLUMN album TEXT COLLATE NOCASE
+        GENERATED ALWAYS AS (COALESCE(json_extract(data, '$.metadata.album'), '')) VIRTUAL;
+    ALTER TABLE songs ADD COLUMN date_added REAL
+        GENERATED ALWAYS AS (COALESCE(json_extract(data, '$.date_added'), 0)) VIRTUAL;
+    CREATE INDEX IF NOT EXISTS idx_songs_title ON songs(title, path);
+    CREATE INDEX IF NOT EXISTS idx_songs_artist ON songs(artist, path);
+    CREATE INDEX IF NOT EXISTS idx_songs_album ON songs(album, path);
+    CREATE INDEX IF NOT EXISTS idx_songs_date_added ON songs(date_added, path);
+
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO meta (key, value) VALUES ('library_version', 0);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        data TEXT,
+        created_at REAL NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS manifest (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        inode INTEGER NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS download_metadata (
+        transfer_key TEXT PRIMARY KEY,
+        file_path TEXT,
+        data TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_download_metadata_file_path ON download_metadata(file_path);
+    CREATE INDEX IF NOT EXISTS idx_download_metadata_expires_at ON download_metadata(expires_at);
+    """,
+]
+
+# How many change log entries are kept for clients resuming a change feed.
+CHANGE_LOG_RETENTION = 20000
+
+# Search metadata of downloads is kept until the song made from the file is
+# committed, but no longer than this, and only for the most recent downloads.
+DOWNLOAD_METADATA_TTL = 30 * 24 * 3600
+DOWNLOAD_METADATA_LIMIT = 5000
+
+
+class LibraryStore:
+    """
+    SQLite-backed document store for the library tables.
+
+    Documents are kept as JSON next to a uniquely indexed key column, so
+    lookups by key are index seeks and a write only touches its own row.
+    Writes go through a single connection guarded by a lock; reads use one
+    connection per thread, which WAL mode allows to run alongside a writer.
+    """
+
+    TABLE_KEYS = {'songs': 'path', 'lyrics': 'file_path', 'playlists': 'id'}
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._tx_depth = 0
+        self._tx_owner = None
+        self._tx_changes = False
+        self._commit_listeners: List[Callable[[], None]] = []
+        self._conn = self._connect()
+        self._migrate()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _migrate(self):
+        with self._write_lock:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            for index in range(version, len(MIGRATIONS)):
+                logging.info(f"Applying library schema migration {index + 1}")
+                self._conn.executescript(f"BEGIN;\n{MIGRATIONS[index]}\nPRAGMA user_version = {index + 1};\nCOMMIT;")
+
+    def _reader(self) -> sqlite3.Connection:
+        # Inside a write transaction, read through the writer so uncommitted rows are visible.
+        if self._tx_owner == threading.get_ident():
+            return self._conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Runs the enclosed writes atomically. Nested calls join the outer transaction."""
+        with self._write_lock:
+            if self._tx_depth:
+                self._tx_depth += 1
+                try:
+                    yield self._conn
+                finally:
+                    self._tx_depth -= 1
+                return
+
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._tx_depth = 1
+            self._tx_owner = threading.get_ident()
+            self._tx_changes = False
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._tx_depth = 0
+                self._tx_owner = None
+
+            if self._tx_changes:
+                for listener in self._commit_listeners:
+                    try:
+                        listener()
+                    except Exception as e:
+                        logging.error(f"Library commit listener failed: {e}")
+
+    def add_commit_listener(self, listener: Callable[[], None]):
+        """Registers a callback run after every commit that recorded changes."""
+        self._commit_listeners.append(listener)
+
+    def fetch(self, sql: str, params: Iterable[Any] = ()) -> List[tuple]:
+        """Runs a read-only query on the calling thread's connection."""
+        return self._reader().execute(sql, tuple(params)).fetchall()
+
+    # --- Versioning ---
+
+    def version(self) -> int:
+        """A counter that increases with every committed change to the library."""
+        return self.fetch("SELECT value FROM meta WHERE key = 'library_version'")[0][0]
+
+    def _touch(self, conn: sqlite3.Connection):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'library_version'")
+
+    # --- Change log ---
+
+    def record_change(self, kind: str, key: str, data: Optional[Dict[str, Any]] = None) -> int:
+        """Appends an entry to the change log. Must be called inside a transaction."""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO changes (kind, key, data, created_at) VALUES (?, ?, ?, ?)",
+                (kind, key, json.dumps(data) if data is not None else None, time.time())
+            )
+            seq = cursor.lastrowid
+            if seq % 1000 == 0:
+                conn.execute("DELETE FROM changes WHERE seq <= ?", (seq - CHANGE_LOG_RETENTION,))
+            self._tx_changes = True
+            return seq
+
+    def latest_change_seq(self) -> int:
+        return self.fetch("SELECT COALESCE(MAX(seq), 0) FROM changes")[0][0]
+
+    def oldest_change_seq(self) -> int:
+        return self.fetch("SELECT COALESCE(MIN(seq), 0) FROM changes")[0][0]
+
+    def changes_since(self, seq: int, limit: int = 500) -> List[Dict[str, Any]]:
+        rows = self.fetch(
+            "SELECT seq, kind, key, data, created_at FROM changes WHERE seq > ? ORDER BY seq LIMIT ?", (seq, limit)
+        )
+        return [
+            {'seq': row[0], 'kind': row[1], 'key': row[2], 'data': json.loads(row[3]) if row[3] else None, 'ts': row[4]}
+            for row in rows
+        ]
+
+    # --- File manifest ---
+
+    def manifest(self) -> Dict[str, Tuple[int, int, int]]:
+        """Returns the last seen (size, mtime_ns, inode) for every library file."""
+        return {row[0]: (row[1], row[2], row[3]) for row in self.fetch("SELECT path, size, mtime_ns, inode FROM manifest")}
+
+    def manifest_entry(self, path: str) -> Optional[Tuple[int, int, int]]:
+        rows = self.fetch("SELECT size, mtime_ns, inode FROM manifest WHERE path = ?", (path,))
+        return tuple(rows[0]) if rows else None
+
+    def set_manifest_entries(self, entries: Iterable[Tuple[str, int, int, int]]):
+        with self.transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO manifest (path, size, mtime_ns, inode) VALUES (?, ?, ?, ?)", entries)
+
+    def rename_manifest_entry(self, old_path: str, new_path: str):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM manifest WHERE path = ?", (new_path,))
+            conn.execute("UPDATE manifest SET path = ? WHERE path = ?", (new_path, old_path))
+
+    def remove_manifest_entries(self, paths: Iterable[str]):
+        with self.transaction() as conn:
+            conn.executemany("DELETE FROM manifest WHERE path = ?", ((path,) for path in paths))
+
+    # --- Download metadata ---
+
+    def put_download_metadata(self, transfer_key: str, data: Dict[str, Any]):
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO download_metadata (transfer_key, file_path, data, created_at, expires_at)"
+                " VALUES (?, NULL, ?, ?, ?)",
+                (transfer_key, json.dumps(data), now, now + DOWNLOAD_METADATA_TTL)
+            )
+            conn.execute("DELETE FROM download_metadata WHERE expires_at < ?", (now,))
+            conn.execute(
+                "DELETE FROM download_metadata WHERE transfer_key IN"
+                " (SELECT transfer_key FROM download_metadata ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (DOWNLOAD_METADATA_LIMIT,)
+            )
+
+    def attach_download_file(self, transfer_key: str, file_path: str) -> Optional[Dict[str, Any]]:
+        """Records where a download was saved and returns its metadata, if any."""
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT data FROM download_metadata WHERE transfer_key = ? AND expires_at >= ?", (transfer_key, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            # A file downloaded again replaces the metadata of the earlier download.
+            conn.execute("DELETE FROM download_metadata WHERE file_path = ? AND transfer_key != ?", (file_path, transfer_key))
+            conn.execute("UPDATE download_metadata SET file_path = ? WHERE transfer_key = ?", (file_path, transfer_key))
+        return json.loads(row[0])
+
+    def download_metadata_for_file(self, file_path: str) -> Optional[Dict[str, Any]]:
+        rows = self.fetch(
+            "SELECT data FROM download_metadata WHERE file_path = ? AND expires_at >= ?", (file_path, time.time())
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def remove_download_metadata(self, transfer_key: str):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM download_metadata WHERE transfer_key = ?", (transfer_key,))
+
+    def remove_download_metadata_for_files(self, file_paths: Iterable[str]):
+        with self.transaction() as conn:
+            conn.executemany("DELETE FROM download_metadata WHERE file_path = ?", ((path,) for path in file_paths))
+
+    def rename_download_files(self, old_path: str, new_path: str):
+        """Points download metadata at a file's new path; for a directory, at the new paths of the files below it."""
+        prefix = os.path.join(old_path, '')
+        with self.transaction() as conn:
+            # OR REPLACE: metadata already attached to the new path belongs to the file being replaced.
+            conn.execute("UPDATE OR REPLACE download_metadata SET file_path = ? WHERE file_path = ?", (new_path, old_path))
+            conn.execute(
+                "UPDATE OR REPLACE download_metadata SET file_path = ? || substr(file_path, ?) WHERE substr(file_path, 1, ?) = ?",
+                (os.path.join(new_path, ''), len(prefix) + 1, len(prefix), prefix)
+            )
+
+    # --- Documents ---
+
+    def all(self, table: str) -> List[Dict[str, Any]]:
+        rows = self._reader().execute(f"SELECT data FROM {table} ORDER BY rowid").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get(self, table: str, key: str) -> Optional[Dict[str, Any]]:
+        key_column = self.TABLE_KEYS[table]
+        row = self._reader().execute(f"SELECT data FROM {table} WHERE {key_column} = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def keys(self, table: str) -> List[str]:
+        key_column = self.TABLE_KEYS[table]
+        return [row[0] for row in self._reader().execute(f"SELECT {key_column} FROM {table}")]
+
+    def upsert_many(self, table: str, documents: Iterable[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], bool]]:
+        """
+        Inserts or merges documents by their key, like TinyDB's upsert: fields
+        of an existing document that are not in the new one are kept.
+
+        Returns (stored document, created) for every document that actually
+        changed; documents that were already stored as-is are skipped.
+        """
+        key_column = self.TABLE_KEYS[table]
+        changed = []
+        with self.transaction() as conn:
+            for document in documents:
+                key = document[key_column]
+                row = conn.execute(f"SELECT data FROM {table} WHERE {key_column} = ?", (key,)).fetchone()
+                if row:
+                    existing = json.loads(row[0])
+                    merged = {**existing, **document}
+                    if merged == existing:
+                        continue
+                    conn.execute(f"UPDATE {table} SET data = ? WHERE {key_column} = ?", (json.dumps(merged), key))
+                    changed.append((merged, False))
+                else:
+                    conn.execute(f"INSERT INTO {table} ({key_column}, data) VALUES (?, ?)", (key, json.dumps(document)))
+                    changed.append((document, True))
+            if changed:
+                self._touch(conn)
+        return changed
+
+    def upsert(self, table: str, document: Dict[str, Any]) -> List[Tuple[Dict[str, Any], bool]]:
+        return self.upsert_many(table, [document])
+
+    def update(self, table: str, key: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Merges fields into an existing document and returns it, or None if it does not exist."""
+        key_column = self.TABLE_KEYS[table]
+        with self.transaction() as conn:
+            row = conn.execute(f"SELECT data FROM {table} WHERE {key_column} = ?", (key,)).fetchone()
+            if not row:
+                return None
+            document = json.loads(row[0])
+            document.update(fields)
+            new_key = document.get(key_column, key)
+            conn.execute(f"UPDATE {table} SET {key_column} = ?, data = ? WHERE {key_column} = ?",
+                         (new_key, json.dumps(document), key))
+            self._touch(conn)
+            return document
+
+    def remove_many(self, table: str, keys: Iterable[str]) -> List[str]:
+        """Removes documents by key and returns the keys that existed."""
+        key_column = self.TABLE_KEYS[table]
+        removed = []
+        with self.transaction() as conn:
+            for key in keys:
+                if conn.execute(f"DELETE FROM {table} WHERE {key_column} = ?", (key,)).rowcount:
+                    removed.append(key)
+            if removed:
+                self._touch(conn)
+        return removed
+
+    def remove(self, table: str, key: str) -> List[str]:
+        return self.remove_many(table, [key])
+
+    # --- Legacy import ---
+
+    def import_tinydb(self, legacy_path: str) -> bool:
+        """
+        One-time import of a TinyDB JSON database. The legacy file is renamed
+        afterwards so the import never runs twice.
+        """
+        if not os.path.exists(legacy_path) or os.path.getsize(legacy_path) == 0:
+            return False
+
+        try:
+            with open(legacy_path, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not read legacy library database {legacy_path}: {e}")
+            return False
+
+        counts = {}
+        with self.transaction():
+            for table, key_column in self.TABLE_KEYS.items():
+                documents = list((legacy.get(table) or {}).values())
+                documents = [doc for doc in documents if isinstance(doc, dict) and doc.get(key_column)]
+                self.upsert_many(table, documents)
+                counts[table] = len(documents)
+
+        os.replace(legacy_path, legacy_path + '.migrated')
+        logging.info(f"Migrated legacy library database {legacy_path}: {counts}")
+        return True
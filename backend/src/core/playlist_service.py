@@ -1,6 +1,7 @@
 import os
-import requests
+import httpx
 import logging
+from core.http_client import http_client
 from typing import Dict, Any, Optional
 
 class PlaylistService:
@@ -14,7 +15,7 @@ class PlaylistService:
             return None
 
         try:
-            response = requests.get(thumbnail_url, stream=True)
+            response = http_client.get(thumbnail_url)
             response.raise_for_status()
 
             # Create a safe filename for the playlist thumbnail
@@ -23,12 +24,11 @@ class PlaylistService:
             thumbnail_path = os.path.join(self.covers_path, file_name)
 
             with open(thumbnail_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+                f.write(response.content)
             
             logging.info(f"Successfully downloaded and saved playlist thumbnail to {thumbnail_path}")
             return file_name.replace('\\', '/')
 
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logging.error(f"Error downloading playlist thumbnail from {thumbnail_url}: {e}")
             return None
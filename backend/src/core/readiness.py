@@ -0,0 +1,83 @@
+import time
+import threading
+from typing import Any, Dict, Optional
+
+# Startup phases in the order they normally complete.
+PHASES = (
+    'config_loaded',
+    'database_open',
+    'soulseek_connected',
+    'shares_initialized',
+    'initial_sync',
+    'watcher_live',
+)
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Readiness:
+    """
+    Records when each startup phase started and finished, so clients can
+    tell what the backend is still waiting for and cold starts can be
+    measured. A phase completes once: later rescans or reconnects don't
+    restart it, but a failed phase may be retried and still succeed.
+    """
+
+    def __init__(self):
+        # Wall-clock time for clients; monotonic time for durations.
+        self.started_at = time.time()
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._phases: Dict[str, Dict[str, Any]] = {name: {'status': PENDING} for name in PHASES}
+
+    def set_started(self, wall_time: float, monotonic_time: float):
+        """Moves the start of the process back to before this module was imported."""
+        with self._lock:
+            self.started_at = wall_time
+            self._started = monotonic_time
+
+    def start(self, phase: str):
+        with self._lock:
+            if self._phases[phase]['status'] in (PENDING, FAILED):
+                self._phases[phase] = {'status': RUNNING, 'started_at': time.time(), '_started': time.monotonic()}
+
+    def finish(self, phase: str, error: Optional[str] = None):
+        with self._lock:
+            state = self._phases[phase]
+            if state['status'] == DONE:
+                return
+            now = time.monotonic()
+            started = state.get('_started', now)
+            state.update(
+                status=FAILED if error else DONE,
+                started_at=state.get('started_at', time.time()),
+                finished_at=time.time(),
+                duration=round(now - started, 3),
+                since_start=round(now - self._started, 3),
+            )
+            if error:
+                state['error'] = error
+            else:
+                state.pop('error', None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            phases = {
+                name: {key: value for key, value in state.items() if not key.startswith('_')}
+                for name, state in self._phases.items()
+            }
+            for name, state in phases.items():
+                if state['status'] == RUNNING:
+                    state['duration'] = round(time.monotonic() - self._phases[name]['_started'], 3)
+        return {
+            'ready': all(state['status'] == DONE for state in phases.values()),
+            'started_at': self.started_at,
+            'uptime': round(time.monotonic() - self._started, 3),
+            'phases': phases,
+        }
+
+
+readiness = Readiness()
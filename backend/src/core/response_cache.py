@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple
+
+# Default lifetimes of cached lookups, in seconds.
+DEFAULT_TTL = 30 * 24 * 3600
+NEGATIVE_TTL = 3 * 24 * 3600
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Keys looked up per query by get_many, within SQLite's bound parameter limit.
+BATCH_KEYS = 500
+
+
+def normalize_key(namespace: str, parts: Iterable[Any]) -> str:
+    """Builds a cache key that ignores case and whitespace differences in the query."""
+    normalized = [' '.join(str(part).split()).casefold() if part is not None else '' for part in parts]
+    return '\x1f'.join([namespace, *normalized])
+
+
+class ResponseCache:
+    """
+    Persistent cache for the results of remote lookups (MusicBrainz, Cover Art
+    Archive, lrclib), so reprocessing a library repeats no network calls.
+
+    Entries are JSON values keyed by a normalized query and expire after a
+    TTL. A lookup that found nothing is stored as None with a shorter TTL
+    (negative caching), so misses aren't retried on every run; failed
+    requests are not cached at all. When the cache grows past `max_bytes`,
+    the least recently used entries are evicted.
+    """
+
+    MISS = object()
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT, size INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, namespace: str, *parts: Any) -> Any:
+        """Returns the cached value (None for a cached miss), or ResponseCache.MISS."""
+        key = normalize_key(namespace, parts)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, size, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or row[2] < now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._size -= row[1]
+                self._misses += 1
+                return self.MISS
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._hits += 1
+        return json.loads(row[0]) if row[0] is not None else None
+
+    def set(self, namespace: str, parts: Iterable[Any], value: Any, ttl: Optional[float] = None):
+        key = normalize_key(namespace, parts)
+        if ttl is None:
+            ttl = DEFAULT_TTL if value is not None else NEGATIVE_TTL
+        data = json.dumps(value) if value is not None else None
+        size = len(key) + (len(data) if data else 0)
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, data, size, now + ttl, now),
+            )
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def get_many(self, namespace: str, parts_list: Sequence[Iterable[Any]]) -> List[Any]:
+        """Looks up several entries in one transaction; returns their values in order, MISS for those not cached."""
+        keys = [normalize_key(namespace, parts) for parts in parts_list]
+        now = time.time()
+        found = {}
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for start in range(0, len(keys), BATCH_KEYS):
+                    batch = keys[start:start + BATCH_KEYS]
+                    found.update((row[0], row[1:]) for row in self._conn.execute(
+                        f"SELECT key, value, size, expires_at FROM responses WHERE key IN ({','.join('?' * len(batch))})",
+                        batch,
+                    ))
+                expired = [key for key, row in found.items() if row[2] < now]
+                for key in expired:
+                    self._size -= found.pop(key)[1]
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", ((key,) for key in expired))
+                self._conn.executemany("UPDATE responses SET accessed_at = ? WHERE key = ?", ((now, key) for key in found))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            hits = sum(key in found for key in keys)
+            self._hits += hits
+            self._misses += len(keys) - hits
+        return [
+            self.MISS if key not in found else json.loads(found[key][0]) if found[key][0] is not None else None
+            for key in keys
+        ]
+
+    def set_many(self, namespace: str, items: Iterable[Tuple[Iterable[Any], Any]], ttl: Optional[float] = None):
+        """Stores several (parts, value) entries in one transaction."""
+        now = time.time()
+        rows = {}
+        for parts, value in items:
+            key = normalize_key(namespace, parts)
+            data = json.dumps(value) if value is not None else None
+            expires_at = now + (ttl if ttl is not None else DEFAULT_TTL if value is not None else NEGATIVE_TTL)
+            rows[key] = (key, data, len(key) + (len(data) if data else 0), expires_at, now)
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                old = 0
+                keys = list(rows)
+                for start in range(0, len(keys), BATCH_KEYS):
+                    batch = keys[start:start + BATCH_KEYS]
+                    old += self._conn.execute(
+                        f"SELECT COALESCE(SUM(size), 0) FROM responses WHERE key IN ({','.join('?' * len(batch))})", batch
+                    ).fetchone()[0]
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO responses (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    rows.values(),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._size += sum(row[2] for row in rows.values()) - old
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def get_or_fetch(self, namespace: str, parts: Iterable[Any], fetch: Callable[[], Any],
+                     ttl: Optional[float] = None, negative_ttl: Optional[float] = None) -> Any:
+        """
+        Returns the cached value, or calls `fetch` and caches its result. `fetch`
+        returns None when the remote has nothing; exceptions propagate uncached.
+        """
+        parts = list(parts)
+        cached = self.get(namespace, *parts)
+        if cached is not self.MISS:
+            return cached
+        value = fetch()
+        self.set(namespace, parts, value, ttl if value is not None else negative_ttl)
+        return value
+
+    def stats(self):
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {'entries': count, 'bytes': self._size, 'hits': self._hits, 'misses': self._misses}
+
+    def _evict(self):
+        # Called with the lock held. Frees a tenth of the budget at once so eviction doesn't run on every write.
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        logging.info(f"Response cache evicted {len(evicted)} entries")
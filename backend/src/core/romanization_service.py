@@ -1,10 +1,197 @@
-import uroman as ur
+import os
+import re
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.response_cache import ResponseCache
+
+# Romanized lines kept in memory; the persistent memo holds the rest.
+MEMO_ENTRIES = 8192
+MEMO_TTL = 365 * 24 * 3600
+MEMO_MAX_BYTES = 16 * 1024 * 1024
+# Batches with at least this many new lines are romanized in worker processes.
+# Each worker loads uroman's tables once, which takes as long as romanizing
+# several thousand lines, so smaller batches are faster in-process. Without
+# at least two spare cores there is no pool.
+POOL_MIN_LINES = 10000
+POOL_WORKERS = min(4, (os.cpu_count() or 1) - 1)
+POOL_CHUNK_SIZE = 250
+
+# Letters outside these ranges belong to a non-Latin script.
+_LATIN_RANGES = (
+    (0x0000, 0x024F),  # Basic Latin to Latin Extended-B
+    (0x0250, 0x02FF),  # IPA extensions, spacing modifiers
+    (0x1D00, 0x1DBF),  # Phonetic extensions
+    (0x1E00, 0x1EFF),  # Latin Extended Additional
+    (0x2C60, 0x2C7F),  # Latin Extended-C
+    (0xA720, 0xA7FF),  # Latin Extended-D
+    (0xAB30, 0xAB6F),  # Latin Extended-E
+    (0xFB00, 0xFB06),  # Latin ligatures
+)
+# Leading LRC time tags, e.g. "[01:02.34]" or "[01:02.34][02:10.00]".
+_LRC_TIME_TAGS = re.compile(r'^((?:\[\d+:\d+(?:[.:]\d+)?\])+)(.*)$')
+
+_worker_uroman = None
+
+
+def _is_latin(ch: str) -> bool:
+    code = ord(ch)
+    return any(start <= code <= end for start, end in _LATIN_RANGES)
+
+
+def needs_romanization(text: str) -> bool:
+    """True if the text contains letters of a non-Latin script."""
+    if not text or text.isascii():
+        return False
+    return any(ch.isalpha() and not _is_latin(ch) for ch in set(text))
+
+
+def _romanize_chunk(lines: List[str]) -> List[str]:
+    # Runs in a pool worker, which loads its own uroman once.
+    global _worker_uroman
+    if _worker_uroman is None:
+        import uroman as ur
+        _worker_uroman = ur.Uroman()
+    return [_worker_uroman.romanize_string(line) for line in lines]
+
 
 class RomanizationService:
-    def __init__(self):
-        self.uroman = ur.Uroman()
+    """
+    Romanizes lyrics with uroman.
+
+    Text is romanized line by line, and only lines in a non-Latin script are
+    passed to uroman; the rest are returned as they are. Romanized lines are
+    memoized in memory and on disk, so the synced lyrics reuse the lines of
+    the plain lyrics, and a lyric is never romanized twice. Large batches
+    are spread over a process pool.
+
+    uroman takes seconds to load its tables, so it is loaded on first use or
+    by warm_up(), not when the service is created.
+    """
+
+    def __init__(self, data_path: Optional[str] = None):
+        self._uroman = None
+        self._uroman_lock = threading.Lock()
+        self._memo: 'OrderedDict[str, str]' = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self._store = None
+        if data_path:
+            self._store = ResponseCache(os.path.join(data_path, 'cache', 'romanization.sqlite3'), max_bytes=MEMO_MAX_BYTES)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def uroman(self):
+        with self._uroman_lock:
+            if self._uroman is None:
+                import uroman as ur
+                self._uroman = ur.Uroman()
+            return self._uroman
+
+    def warm_up(self):
+        """Loads uroman ahead of the first lyrics."""
+        return self.uroman
 
     def romanize(self, text: str) -> str:
         if not text:
             return ""
-        return self.uroman.romanize_string(text)
+        return self.romanize_many([text])[0]
+
+    def romanize_lyrics(self, plain_lyrics: Optional[str], synced_lyrics: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """Romanizes both versions of a song's lyrics; the synced lines reuse the plain ones."""
+        texts = [text for text in (plain_lyrics, synced_lyrics) if text]
+        romanized = iter(self.romanize_many(texts))
+        return (next(romanized) if plain_lyrics else None, next(romanized) if synced_lyrics else None)
+
+    def romanize_many(self, texts: List[str]) -> List[str]:
+        """Romanizes several texts, sending each distinct non-Latin line to uroman at most once."""
+        split = [[self._split_line(line) for line in text.split('\n')] if text else [] for text in texts]
+        lines = {body for text in split for _, body in text if needs_romanization(body)}
+        romanized = self._romanize_lines(lines)
+        return [
+            '\n'.join(prefix + romanized.get(body, body) for prefix, body in text) if texts[i] else ""
+            for i, text in enumerate(split)
+        ]
+
+    # --- Internals ---
+
+    @staticmethod
+    def _split_line(line: str) -> Tuple[str, str]:
+        # LRC time tags stay as they are, so a synced line shares its text with the plain line.
+        match = _LRC_TIME_TAGS.match(line)
+        return (match.group(1), match.group(2)) if match else ('', line)
+
+    def _romanize_lines(self, lines: Iterable[str]) -> Dict[str, str]:
+        lines = list(lines)
+        results = self._recall(lines)
+        missing = [line for line in lines if line not in results]
+        if missing:
+            romanized = dict(zip(missing, self._run_uroman(missing)))
+            results.update(romanized)
+            self._remember(romanized)
+        return results
+
+    def _run_uroman(self, lines: List[str]) -> List[str]:
+        if len(lines) >= POOL_MIN_LINES and POOL_WORKERS >= 2:
+            pool = self._process_pool()
+            if pool is not None:
+                chunks = [lines[i:i + POOL_CHUNK_SIZE] for i in range(0, len(lines), POOL_CHUNK_SIZE)]
+                try:
+                    return [result for chunk in pool.map(_romanize_chunk, chunks) for result in chunk]
+                except BrokenProcessPool:
+                    logging.warning("Romanization process pool broke, romanizing in-process.")
+                    with self._pool_lock:
+                        if self._pool is pool:
+                            self._pool = None
+        uroman = self.uroman
+        return [uroman.romanize_string(line) for line in lines]
+
+    def _process_pool(self) -> Optional[ProcessPoolExecutor]:
+        with self._pool_lock:
+            if self._pool is None:
+                try:
+                    self._pool = ProcessPoolExecutor(max_workers=POOL_WORKERS)
+                except (OSError, NotImplementedError) as e:
+                    logging.warning(f"Process pool unavailable, romanizing in-process: {e}")
+            return self._pool
+
+    @staticmethod
+    def _memo_key(line: str) -> str:
+        return hashlib.sha1(line.encode('utf-8')).hexdigest()
+
+    def _recall(self, lines: List[str]) -> Dict[str, str]:
+        """The memoized romanizations of `lines`; the disk store is read in one transaction for all memory misses."""
+        results = {}
+        with self._memo_lock:
+            for line in lines:
+                result = self._memo.get(line)
+                if result is not None:
+                    self._memo.move_to_end(line)
+                    results[line] = result
+        missing = [line for line in lines if line not in results]
+        if self._store is None or not missing:
+            return results
+        stored = self._store.get_many('romanize', [(self._memo_key(line),) for line in missing])
+        found = {line: result for line, result in zip(missing, stored) if result is not ResponseCache.MISS and result is not None}
+        with self._memo_lock:
+            self._memo.update(found)
+            self._trim_memo()
+        results.update(found)
+        return results
+
+    def _remember(self, romanized: Dict[str, str]):
+        with self._memo_lock:
+            self._memo.update(romanized)
+            self._trim_memo()
+        if self._store is not None:
+            self._store.set_many('romanize', (((self._memo_key(line),), result) for line, result in romanized.items()), ttl=MEMO_TTL)
+
+    def _trim_memo(self):
+        # Called with the memo lock held.
+        while len(self._memo) > MEMO_ENTRIES:
+            self._memo.popitem(last=False)
@@ -1,9 +1,13 @@
-import requests
 import json
-from bs4 import BeautifulSoup
-import textwrap
 import sys
-from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+from urllib.parse import quote
+
+import httpx
+
+from core.http_client import http_client
+from utils.concurrency import run_blocking
 
 def format_duration(milliseconds):
     """Converts milliseconds to a MM:SS string format."""
@@ -52,58 +56,65 @@ def format_item(item):
         'explicit': is_explicit
     }
 
-def search_apple_music(search_term):
+def parse_apple_music_page(content: bytes):
+    """Extracts the "Top Results", "Artists", "Albums" and "Songs" sections from a search page."""
+    from bs4 import BeautifulSoup  # Imported on first search, it is slow to load.
+
+    soup = BeautifulSoup(content, 'html.parser')
+    script_tag = soup.find('script', {'id': 'serialized-server-data'})
+
+    if not script_tag:
+        return {"error": "Could not find the data script tag."}
+
+    data = json.loads(script_tag.string)[0]
+    sections = data.get('data', {}).get('sections', [])
+
+    if not sections:
+        return {"error": "No search results found."}
+
+    results = {}
+    sections_to_process = ["Top Results", "Artists", "Albums", "Songs"]
+
+    for section in sections:
+        title = None
+        header_item = section.get('header', {}).get('item', {})
+        if header_item:
+            title_link = header_item.get('titleLink')
+            if title_link and isinstance(title_link, dict):
+                title = title_link.get('title')
+            elif not title:
+                title = header_item.get('title')
+
+        if title in sections_to_process:
+            items = section.get('items', [])
+            if items:
+                results[title] = [format_item(item) for item in items]
+
+    return results
+
+async def search_apple_music(search_term):
     """
     Scrapes and returns formatted "Top Results", "Artists", "Albums", and "Songs" sections.
     """
-    url = f"https://music.apple.com/us/search?term={requests.utils.quote(search_term)}"
+    url = f"https://music.apple.com/us/search?term={quote(search_term)}"
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
 
     try:
-        response = requests.get(url, headers=headers)
+        response = await http_client.aget(url, headers=headers)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        script_tag = soup.find('script', {'id': 'serialized-server-data'})
-        
-        if not script_tag:
-            return {"error": "Could not find the data script tag."}
-
-        data = json.loads(script_tag.string)[0]
-        sections = data.get('data', {}).get('sections', [])
-        
-        if not sections:
-            return {"error": "No search results found."}
-            
-        results = {}
-        sections_to_process = ["Top Results", "Artists", "Albums", "Songs"]
-
-        for section in sections:
-            title = None
-            header_item = section.get('header', {}).get('item', {})
-            if header_item:
-                title_link = header_item.get('titleLink')
-                if title_link and isinstance(title_link, dict):
-                    title = title_link.get('title')
-                elif not title:
-                    title = header_item.get('title')
-            
-            if title in sections_to_process:
-                items = section.get('items', [])
-                if items:
-                    results[title] = [format_item(item) for item in items]
-        
-        return results
-
-    except requests.exceptions.RequestException as e:
+        # The page is large; parsing it is CPU work and runs off the event loop.
+        return await run_blocking('search', parse_apple_music_page, response.content)
+
+    except httpx.HTTPError as e:
         return {"error": f"An error occurred while fetching the page: {e}"}
     except (json.JSONDecodeError, IndexError) as e:
         return {"error": f"An error occurred while parsing the data: {e}"}
     except Exception as e:
         return {"error": f"An unexpected error occurred: {e} on line {sys.exc_info()[-1].tb_lineno}"}
 
-def search_musicbrainz(search_term):
+async def search_musicbrainz(search_term):
     """
     Searches MusicBrainz for recordings and returns formatted results.
     """
@@ -112,8 +123,8 @@ def search_musicbrainz(search_term):
 
     try:
         # Search for recordings
-        search_url = f"https://musicbrainz.org/ws/2/recording/?query={requests.utils.quote(search_term)}&fmt=json&limit=20"
-        search_response = requests.get(search_url)
+        search_url = "https://musicbrainz.org/ws/2/recording/"
+        search_response = await http_client.aget(search_url, params={'query': search_term, 'fmt': 'json', 'limit': 20})
         search_response.raise_for_status()
         search_data = search_response.json()
 
@@ -121,7 +132,7 @@ def search_musicbrainz(search_term):
         for recording in search_data.get('recordings', []):
             artist_credit = recording.get('artist-credit', [{}])[0]
             artist = artist_credit.get('artist', {})
-            
+
             recordings.append({
                 'id': recording.get('id'),
                 'title': recording.get('title'),
@@ -129,48 +140,42 @@ def search_musicbrainz(search_term):
                 'artist': artist.get('name', 'Unknown Artist'),
                 'artistId': artist.get('id'),
                 'score': recording.get('score', 0),
-                'releaseCount': len(recording.get('releases', []))
+                'releaseCount': len(recording.get('releases', [])),
+                'releases': recording.get('releases', []),
             })
 
         # Sort by score and release count
         recordings.sort(key=lambda x: (x['score'], x['releaseCount']), reverse=True)
-        
+
         top_recordings = recordings[:15]
 
-        # Fetch cover art for top recordings in parallel
-        def fetch_cover(recording):
+        # The search response already lists each recording's releases, so only
+        # the Cover Art Archive is asked per recording; MusicBrainz allows one
+        # request per second and a lookup per recording would take seconds.
+        async def fetch_cover(recording):
+            releases = recording.pop('releases')
             try:
-                # Get release info to find a cover art
-                release_url = f"https://musicbrainz.org/ws/2/recording/{recording['id']}?inc=releases&fmt=json"
-                release_response = requests.get(release_url, timeout=5)
-                release_response.raise_for_status()
-                release_data = release_response.json()
-
-                releases = release_data.get('releases', [])
                 if releases:
                     # Sort releases by date to get the most recent one
                     releases.sort(key=lambda r: r.get('date', '0'), reverse=True)
                     release_id = releases[0].get('id')
-                    
+
                     # Fetch cover art from Cover Art Archive
                     cover_art_url = f"https://coverartarchive.org/release/{release_id}/front-250"
-                    cover_art_response = requests.head(cover_art_url, allow_redirects=True, timeout=5)
-                    
+                    cover_art_response = await http_client.ahead(cover_art_url, timeout=5)
+
                     if cover_art_response.status_code == 200:
-                        recording['coverArt'] = cover_art_response.url
+                        recording['coverArt'] = str(cover_art_response.url)
                         recording['releaseDate'] = releases[0].get('date')
                         recording['album'] = releases[0].get('title')
-            except requests.exceptions.RequestException as e:
+            except httpx.HTTPError as e:
                 # Log error but continue, as cover art is not critical
-                print(f"Could not fetch cover art for {recording['id']}: {e}")
+                logging.warning(f"Could not fetch cover art for {recording['id']}: {e}")
             return recording
 
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            results_with_cover = list(executor.map(fetch_cover, top_recordings))
-            
-        return results_with_cover
+        return await asyncio.gather(*(fetch_cover(recording) for recording in top_recordings))
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return {"error": f"An error occurred while fetching data from MusicBrainz: {e}"}
     except (json.JSONDecodeError, IndexError) as e:
         return {"error": f"An error occurred while parsing MusicBrainz data: {e}"}
@@ -179,12 +184,12 @@ def search_musicbrainz(search_term):
 
 
 class SearchService:
-    def search(self, provider: str, query: str):
+    async def search(self, provider: str, query: str):
         if provider == "apple_music":
-            return search_apple_music(query)
+            return await search_apple_music(query)
         if provider == "musicbrainz":
-            return search_musicbrainz(query)
+            return await search_musicbrainz(query)
         # Add other providers here in the future
         return {"error": "Invalid search provider."}
 
-search_service = SearchService()
\ No newline at end of file
+search_service = SearchService()
@@ -1,15 +1,23 @@
 import os
-import requests
 import json
+import httpx
 import threading
-from typing import Dict, Any
-from mutagen import File as MutagenFile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
 import logging
 from core.library_service import LibraryService
+from core.library_scanner import manifest_entry, ManifestEntry
 from core.metadata_service import MetadataService
 from core.romanization_service import RomanizationService
-from core.audio_forensics import analyze_audio_final # Import the new function
-from tinydb import Query
+from core.forensic_service import ForensicService
+from core.http_client import http_client
+from core.response_cache import ResponseCache
+from core.album_resolver import AlbumResolver, album_key
+from core.ingest_pipeline import IngestPipeline, ProcessingJob, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+LOSSLESS_EXTENSIONS = ('.wav', '.flac')
+# Lyrics lookups that run alongside the release lookup, one per enrich worker.
+LYRICS_WORKERS = 4
 
 class SongProcessor:
     def __init__(self, library_service: LibraryService, metadata_service: MetadataService, romanization_service: RomanizationService, data_path: str):
@@ -17,111 +25,199 @@ class SongProcessor:
         self.metadata_service = metadata_service
         self.romanization_service = romanization_service
         self.data_path = data_path
-        self.covers_path = os.path.join(self.data_path, 'covers')
-        os.makedirs(self.covers_path, exist_ok=True)
+        self.response_cache = ResponseCache(os.path.join(self.data_path, 'cache', 'responses.sqlite3'))
+        self.forensics = ForensicService(os.path.join(self.data_path, 'cache', 'forensics.sqlite3'))
+        self.album_resolver = AlbumResolver()
+        self._lyrics_pool = ThreadPoolExecutor(max_workers=LYRICS_WORKERS, thread_name_prefix='lyrics')
         self._processing_lock = threading.Lock()
         self._currently_processing = set()
+        self.pipeline = IngestPipeline(self)
 
-    def process_new_song(self, file_path: str):
+    def process_new_song(self, file_path: str, search_metadata: Optional[Dict[str, Any]] = None):
         """
         Processes a new song file, extracts metadata, and adds it to the library.
         """
-        with self._processing_lock:
-            if file_path in self._currently_processing:
-                logging.info(f"Already processing {file_path}, skipping.")
-                return
-            self._currently_processing.add(file_path)
+        if not self._claim(file_path):
+            logging.info(f"Already processing {file_path}, skipping.")
+            return
 
         try:
             logging.info(f"==> Starting processing for new song: {file_path}")
-            if not os.path.exists(file_path):
-                logging.warning(f"File not found, aborting process: {file_path}")
+            metadata = self._extract_metadata(file_path, search_metadata)
+            if metadata is None:
                 return
 
-            # Step 1: Extract and Merge Metadata from all sources
-            filename = os.path.basename(file_path)
-            logging.info(f"Step 1: Extracting and merging metadata for '{filename}'")
-            download_metadata = self.library_service.download_metadata.get(filename)
-            embedded_metadata = self.metadata_service.extract_metadata_from_file(file_path)
-            metadata = self.metadata_service.merge_metadata(
-                file_metadata=embedded_metadata,
-                search_metadata=download_metadata,
-                filename=filename
-            )
-            metadata['size'] = os.path.getsize(file_path)
-            logging.info(f"Merged metadata: {metadata.get('title')} - {metadata.get('artist')}")
-
-            # Step 1.5: Perform Audio Analysis for Lossless Files
-            file_ext = os.path.splitext(file_path)[1].lower()
-            if file_ext in ['.wav', '.flac']:
-                logging.info(f"Performing audio analysis for {filename}")
-                analysis_verdict = analyze_audio_final(file_path)
-                metadata['is_fake'] = analysis_verdict == 'Fake'
-                logging.info(f"Analysis verdict: {analysis_verdict}, is_fake set to: {metadata['is_fake']}")
-
-            # Step 2: Validate Core Metadata and Fetch from MusicBrainz if Necessary
-            logging.info("Step 2: Validating core metadata")
-            if not metadata.get('title') or not metadata.get('artist'):
-                self._fetch_metadata_from_musicbrainz(metadata)
-                if not metadata.get('title') or not metadata.get('artist'):
-                    metadata['metadata_status'] = 'pending_review'
-
-            # Step 3: Handle Cover Art Fallback (after all metadata is gathered)
-            logging.info("Step 3: Handling cover art")
-            if not metadata.get('coverArt'):
-                if not metadata.get('album'):
-                    self._fetch_metadata_from_musicbrainz(metadata)
-                self._fetch_cover_art(metadata)
-
-            # Step 4: Handle Lyrics Fetching (after all metadata is gathered)
-            logging.info("Step 4: Handling lyrics")
-            self._process_lyrics(file_path, metadata)
+            if self.needs_analysis(file_path):
+                evidence = self.forensics.evidence(file_path, self.declared_duration(file_path))
+                self._apply_analysis_verdict(file_path, metadata, evidence['verdict'])
+
+            self._enrich_metadata(file_path, metadata)
 
             # Step 5: Finalize and Add to Database
             logging.info("Step 5: Finalizing and adding to database")
-            song_data = {
-                'path': os.path.relpath(file_path, os.path.join(self.data_path, "downloads")),
-                'metadata': metadata,
-                'date_added': os.path.getctime(file_path)
-            }
-            self.library_service.add_or_update_song(song_data)
-            logging.info(f"<== Finished processing for song: {filename}")
+            song_data, entry = self._build_song_record(file_path, metadata)
+            self.library_service.add_or_update_songs([song_data], manifest_entries=[entry] if entry else None)
+            logging.info(f"<== Finished processing for song: {os.path.basename(file_path)}")
         finally:
-            with self._processing_lock:
-                if file_path in self._currently_processing:
-                    self._currently_processing.remove(file_path)
+            self._release(file_path)
 
-    def _fetch_cover_art(self, metadata: Dict[str, Any]):
-        artist = metadata.get('artist')
+    def enqueue(self, file_path: str, priority: int = PRIORITY_BACKGROUND,
+                search_metadata: Optional[Dict[str, Any]] = None) -> ProcessingJob:
+        """
+        Queues a file on the central processing queue and returns its job.
+        Use PRIORITY_INTERACTIVE for user-triggered work so it overtakes bulk syncs.
+        `search_metadata` is the search result a download came from.
+        """
+        return self.pipeline.submit(file_path, priority, search_metadata=search_metadata)
+
+    def get_job(self, job_id: str) -> Optional[ProcessingJob]:
+        return self.pipeline.get_job(job_id)
+
+    def _claim(self, file_path: str) -> bool:
+        """Marks a file as being processed. Returns False if it already is."""
+        with self._processing_lock:
+            if file_path in self._currently_processing:
+                return False
+            self._currently_processing.add(file_path)
+            return True
+
+    def _release(self, file_path: str):
+        with self._processing_lock:
+            self._currently_processing.discard(file_path)
+
+    # The stages below are shared by process_new_song and the IngestPipeline,
+    # so both paths produce the same song records.
+
+    def _extract_metadata(self, file_path: str, search_metadata: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Step 1: Extract and merge metadata from all local sources. Returns None if the file is gone."""
+        if not os.path.exists(file_path):
+            logging.warning(f"File not found, aborting process: {file_path}")
+            return None
+
+        filename = os.path.basename(file_path)
+        logging.info(f"Step 1: Extracting and merging metadata for '{filename}'")
+        if search_metadata is None:
+            # Files picked up by a sync or the watcher may still have come from a download.
+            search_metadata = self.library_service.get_download_metadata(file_path)
+        embedded_metadata = self.metadata_service.extract_metadata_from_file(file_path)
+        metadata = self.metadata_service.merge_metadata(
+            file_metadata=embedded_metadata,
+            search_metadata=search_metadata,
+            filename=filename
+        )
+        metadata['size'] = os.path.getsize(file_path)
+        logging.info(f"Merged metadata: {metadata.get('title')} - {metadata.get('artist')}")
+        return metadata
+
+    @staticmethod
+    def needs_analysis(file_path: str) -> bool:
+        """Only lossless files get the authenticity analysis."""
+        return os.path.splitext(file_path)[1].lower() in LOSSLESS_EXTENSIONS
+
+    def declared_duration(self, file_path: str) -> Optional[float]:
+        """Duration in the file's headers, in seconds, from the probe cached during extraction."""
+        info = self.metadata_service.prober.probe(file_path)
+        return info.duration if info else None
+
+    def _apply_analysis_verdict(self, file_path: str, metadata: Dict[str, Any], analysis_verdict: str):
+        """Step 1.5: Record the forensic verdict for a lossless file."""
+        metadata['is_fake'] = analysis_verdict == 'Fake'
+        logging.info(f"Analysis verdict for {os.path.basename(file_path)}: {analysis_verdict}, is_fake set to: {metadata['is_fake']}")
+
+    def _enrich_metadata(self, file_path: str, metadata: Dict[str, Any]):
+        """
+        Steps 2-4: Fill in missing metadata, cover art and lyrics from online sources.
+
+        Lyrics only need artist and title. When the tags have both, the lyrics
+        lookup starts right away and runs alongside the release lookup; cover
+        art still follows the release, which may supply the album.
+        """
+        lyrics = None
+        if metadata.get('title') and metadata.get('artist'):
+            # Steps 2 and 3 only fill in missing fields, so the lyrics lookup can work on a copy.
+            lyrics = self._lyrics_pool.submit(self._process_lyrics, file_path, dict(metadata))
+
+        # Step 2: Validate Core Metadata and Fetch from MusicBrainz if Necessary
+        logging.info("Step 2: Validating core metadata")
+        if not metadata.get('title') or not metadata.get('artist'):
+            self._fetch_metadata_from_musicbrainz(metadata)
+            if not metadata.get('title') or not metadata.get('artist'):
+                metadata['metadata_status'] = 'pending_review'
+
+        # Step 3: Handle Cover Art Fallback (after all metadata is gathered)
+        logging.info("Step 3: Handling cover art")
+        if not metadata.get('coverArt'):
+            if not metadata.get('album'):
+                self._fetch_metadata_from_musicbrainz(metadata)
+            self._fetch_cover_art(file_path, metadata)
+
+        # Step 4: Handle Lyrics Fetching (after all metadata is gathered)
+        logging.info("Step 4: Handling lyrics")
+        if lyrics is None:
+            self._process_lyrics(file_path, metadata)
+        else:
+            lyrics.result()
+
+    def _build_song_record(self, file_path: str, metadata: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[ManifestEntry]]:
+        """Builds the song document and its manifest entry for the database."""
+        music_directory = os.path.join(self.data_path, "downloads")
+        song_data = {
+            'path': os.path.relpath(file_path, music_directory),
+            'metadata': metadata,
+            'date_added': os.path.getctime(file_path)
+        }
+        return song_data, manifest_entry(file_path, music_directory)
+
+    def _fetch_cover_art(self, file_path: str, metadata: Dict[str, Any]):
+        """Looks up the album's cover once per album and applies it to this track."""
+        artist = metadata.get('albumArtist') or metadata.get('artist')
         album = metadata.get('album')
         if not artist or not album:
             return
 
-        try:
-            mb_url = f"http://musicbrainz.org/ws/2/release/?query=artist:{artist} AND release:{album}&fmt=json"
-            headers = {'User-Agent': 'Sonosano/1.0.0 ( https://github.com/KRSHH/Sonosano )'}
-            response = requests.get(mb_url, headers=headers)
+        cover = self.album_resolver.resolve(album_key(file_path, metadata), lambda: self._resolve_album_cover(artist, album))
+        if cover:
+            metadata.update(cover)
+
+    def _resolve_album_cover(self, artist: str, album: str) -> Optional[Dict[str, Any]]:
+        """Finds the release of an album and downloads its cover. Returns the cover fields for the song metadata."""
+
+        def lookup_cover_url() -> Optional[str]:
+            mb_url = "https://musicbrainz.org/ws/2/release/"
+            params = {'query': f"artist:{artist} AND release:{album}", 'fmt': 'json'}
+            response = http_client.get(mb_url, params=params)
             response.raise_for_status()
             mb_data = response.json()
+            if not mb_data.get('releases'):
+                return None
+
+            release_id = mb_data['releases'][0]['id']
+            ca_url = f"https://coverartarchive.org/release/{release_id}"
+            response = http_client.get(ca_url)
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            ca_data = response.json()
+            if not ca_data.get('images'):
+                return None
+            return ca_data['images'][0]['thumbnails']['large']
+
+        try:
+            image_url = self.response_cache.get_or_fetch('coverart.release', (artist, album), lookup_cover_url)
+            if not image_url:
+                return None
 
-            if mb_data.get('releases'):
-                release_id = mb_data['releases'][0]['id']
-                ca_url = f"http://coverartarchive.org/release/{release_id}"
-                response = requests.get(ca_url, headers=headers)
-                if response.status_code == 200:
-                    ca_data = response.json()
-                    if ca_data.get('images'):
-                        image_url = ca_data['images'][0]['thumbnails']['large']
-                        image_response = requests.get(image_url)
-                        image_response.raise_for_status()
-                        file_name = f"{artist}_{album}.jpg".replace('/', '_')
-                        cover_path = os.path.join(self.covers_path, file_name)
-                        with open(cover_path, 'wb') as f:
-                            f.write(image_response.content)
-                        metadata['coverArt'] = file_name.replace('\\', '/')
-                        metadata['coverArtUrl'] = image_url
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching cover art: {e}")
+            cover_store = self.metadata_service.cover_store
+            digest = self.response_cache.get('coverart.image', image_url)
+            if digest is ResponseCache.MISS or not digest or not cover_store.path(digest):
+                image_response = http_client.get(image_url)
+                image_response.raise_for_status()
+                digest = cover_store.put(image_response.content)
+                self.response_cache.set('coverart.image', (image_url,), digest)
+            return {'coverArt': cover_store.relative_path(digest), 'coverHash': digest, 'coverArtUrl': image_url}
+        except httpx.HTTPError as e:
+            # Raised so the album is looked up again next time instead of being remembered as coverless.
+            raise RuntimeError(f"Error fetching cover art: {e}") from e
 
     def _process_lyrics(self, file_path: str, metadata: Dict[str, Any]):
         logging.info(f"Processing lyrics for: {file_path}")
@@ -137,43 +233,45 @@ class SongProcessor:
             logging.warning(f"Skipping lyrics fetch for '{os.path.basename(file_path)}' due to missing artist/title metadata.")
             return
 
-        try:
+        def lookup_lyrics() -> Optional[Dict[str, Any]]:
             logging.info(f"Fetching lyrics from lrclib for: Title='{title}', Artist='{artist}'")
-            lrc_url = f"https://lrclib.net/api/get"
+            lrc_url = "https://lrclib.net/api/get"
             params = {'artist_name': artist, 'track_name': title}
-            response = requests.get(lrc_url, params=params)
-            response.raise_for_status()
-            
+            response = http_client.get(lrc_url, params=params)
             if response.status_code == 404 or not response.content:
                 logging.info(f"lrclib returned 404 or empty response for '{title}' by '{artist}'")
-                return
+                return None
+            response.raise_for_status()
 
             lrc_data = response.json()
-
-            if lrc_data and (lrc_data.get('syncedLyrics') or lrc_data.get('plainLyrics')):
-                plain_lyrics = lrc_data.get('plainLyrics')
-                synced_lyrics = lrc_data.get('syncedLyrics')
-                plain_lyrics_romanized = self.romanization_service.romanize(plain_lyrics) if plain_lyrics else None
-                synced_lyrics_romanized = self.romanization_service.romanize(synced_lyrics) if synced_lyrics else None
-
-                lyrics_data = {
-                    'file_path': file_path,
-                    'plain_lyrics': plain_lyrics,
-                    'synced_lyrics': synced_lyrics,
-                    'plain_lyrics_romanized': plain_lyrics_romanized,
-                    'synced_lyrics_romanized': synced_lyrics_romanized,
-                }
-                logging.info(f"Saving lyrics to database for file_path: '{file_path}'")
-                self.library_service.upsert_lyrics(lyrics_data, file_path)
-                logging.info(f"Successfully fetched and cached lyrics for '{os.path.basename(file_path)}'")
-            else:
+            if not lrc_data or not (lrc_data.get('syncedLyrics') or lrc_data.get('plainLyrics')):
                 logging.info(f"No lyrics content found in lrclib response for '{title}' by '{artist}'")
+                return None
+            return {'plainLyrics': lrc_data.get('plainLyrics'), 'syncedLyrics': lrc_data.get('syncedLyrics')}
+
+        try:
+            # Misses are cached too, so songs without lyrics on lrclib aren't asked for on every run.
+            lrc_data = self.response_cache.get_or_fetch('lrclib.get', (artist, title), lookup_lyrics)
+            if not lrc_data:
+                return
 
-        except requests.exceptions.RequestException as e:
-            if e.response and e.response.status_code == 404:
-                logging.info(f"No lyrics found on lrclib (404) for '{title}' by '{artist}'")
-            else:
-                logging.error(f"Network error fetching lyrics for '{os.path.basename(file_path)}': {e}")
+            plain_lyrics = lrc_data.get('plainLyrics')
+            synced_lyrics = lrc_data.get('syncedLyrics')
+            plain_lyrics_romanized, synced_lyrics_romanized = self.romanization_service.romanize_lyrics(plain_lyrics, synced_lyrics)
+
+            lyrics_data = {
+                'file_path': file_path,
+                'plain_lyrics': plain_lyrics,
+                'synced_lyrics': synced_lyrics,
+                'plain_lyrics_romanized': plain_lyrics_romanized,
+                'synced_lyrics_romanized': synced_lyrics_romanized,
+            }
+            logging.info(f"Saving lyrics to database for file_path: '{file_path}'")
+            self.library_service.upsert_lyrics(lyrics_data, file_path)
+            logging.info(f"Successfully fetched and cached lyrics for '{os.path.basename(file_path)}'")
+
+        except httpx.HTTPError as e:
+            logging.error(f"Network error fetching lyrics for '{os.path.basename(file_path)}': {e}")
         except json.JSONDecodeError:
             logging.warning(f"Could not decode JSON lyrics response for '{title}' by '{artist}'. It might not be available.")
         except Exception as e:
@@ -187,20 +285,29 @@ class SongProcessor:
         if title: query_parts.append(f"recording:{title}")
         if not query_parts: return
 
-        try:
-            mb_url = f"http://musicbrainz.org/ws/2/recording/?query={' AND '.join(query_parts)}&fmt=json"
-            headers = {'User-Agent': 'Sonosano/1.0.0 ( https://github.com/KRSHH/Sonosano )'}
-            response = requests.get(mb_url, headers=headers)
+        def lookup_recording() -> Optional[Dict[str, Any]]:
+            mb_url = "https://musicbrainz.org/ws/2/recording/"
+            response = http_client.get(mb_url, params={'query': ' AND '.join(query_parts), 'fmt': 'json'})
             response.raise_for_status()
             mb_data = response.json()
+            if not mb_data.get('recordings'):
+                return None
 
-            if mb_data.get('recordings'):
-                top_recording = mb_data['recordings'][0]
-                if not metadata.get('title') and top_recording.get('title'):
-                    metadata['title'] = top_recording['title']
-                if not metadata.get('artist') and top_recording.get('artist-credit'):
-                    metadata['artist'] = top_recording['artist-credit'][0]['name']
-                if not metadata.get('album') and top_recording.get('releases'):
-                    metadata['album'] = top_recording['releases'][0]['title']
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching metadata from MusicBrainz: {e}")
\ No newline at end of file
+            top_recording = mb_data['recordings'][0]
+            return {
+                'title': top_recording.get('title'),
+                'artist': top_recording['artist-credit'][0]['name'] if top_recording.get('artist-credit') else None,
+                'album': top_recording['releases'][0]['title'] if top_recording.get('releases') else None,
+            }
+
+        try:
+            match = self.response_cache.get_or_fetch('musicbrainz.recording', (artist, title), lookup_recording)
+            if match:
+                if not metadata.get('title') and match.get('title'):
+                    metadata['title'] = match['title']
+                if not metadata.get('artist') and match.get('artist'):
+                    metadata['artist'] = match['artist']
+                if not metadata.get('album') and match.get('album'):
+                    metadata['album'] = match['album']
+        except httpx.HTTPError as e:
+            logging.error(f"Error fetching metadata from MusicBrainz: {e}")
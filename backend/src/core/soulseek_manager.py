@@ -14,10 +14,13 @@ from pynicotine.slskmessages import FileListMessage
 
 from utils.file_system_utils import is_audio_file
 from .library_service import LibraryService
+from .readiness import readiness
+from .song_processor import SongProcessor, PRIORITY_INTERACTIVE
 
 class SoulseekManager:
-    def __init__(self, library_service: LibraryService, data_path: str):
+    def __init__(self, library_service: LibraryService, song_processor: SongProcessor, data_path: str):
         self.library_service = library_service
+        self.song_processor = song_processor
         self.data_path = data_path
         self.logged_in = False
         self.login_event = threading.Event()
@@ -31,10 +34,19 @@ class SoulseekManager:
             self.logged_in = True
             username = config.sections['server']['login']
             logging.info(f"Successfully logged in as {username}")
+            readiness.finish('soulseek_connected')
             self.login_event.set()
         else:
             self.logged_in = False
-            logging.error(f"Login failed: {msg.reason if hasattr(msg, 'reason') else 'Unknown reason'}")
+            reason = msg.reason if hasattr(msg, 'reason') else 'Unknown reason'
+            logging.error(f"Login failed: {reason}")
+            readiness.finish('soulseek_connected', error=f"Login failed: {reason}")
+
+    def on_shares_preparing(self):
+        readiness.start('shares_initialized')
+
+    def on_shares_ready(self, successful):
+        readiness.finish('shares_initialized', error=None if successful else "Share scan failed")
 
     def on_disconnect(self, msg):
         self.logged_in = False
@@ -113,13 +125,6 @@ class SoulseekManager:
         self.download_status[key] = status_obj
         
         if status == TransferStatus.FINISHED:
-            filename = os.path.basename(file_path)
-            if key in self.library_service.download_metadata or key in self.active_downloads:
-                metadata = self.library_service.download_metadata.get(key) or (self.active_downloads.get(key, {}).get('metadata'))
-                if metadata:
-                    self.library_service.download_metadata[key] = metadata
-                    self.library_service.download_metadata[filename] = metadata
-            
             def delayed_rescan():
                 time.sleep(1)
                 try:
@@ -130,6 +135,19 @@ class SoulseekManager:
             rescan_thread = threading.Thread(target=delayed_rescan, daemon=True)
             rescan_thread.start()
 
+    def on_download_finished(self, transfer, download_file_path):
+        """
+        Hands a finished download straight to the processing queue, together
+        with the search result it was downloaded from. The file watcher sees the
+        same file later and skips it, since it is already queued or ingested.
+        """
+        if not is_audio_file(download_file_path, None):
+            return
+        metadata = self.library_service.attach_download_file(transfer.username, transfer.virtual_path, download_file_path)
+
+        logging.info(f"Download finished, queueing for processing: {download_file_path}")
+        self.song_processor.enqueue(download_file_path, PRIORITY_INTERACTIVE, search_metadata=metadata)
+
     def initialize_soulseek(self):
         core.init_components(enabled_components={
             "error_handler", "network_thread", "shares", "users", "notifications",
@@ -142,6 +160,12 @@ class SoulseekManager:
         events.connect("server-disconnect", self.on_disconnect)
         events.connect("file-search-response", self.on_search_result)
         events.connect("update-download", self.on_download_update)
+        events.connect("file-download-finished", self.on_download_finished)
+        events.connect("shares-preparing", self.on_shares_preparing)
+        events.connect("shares-ready", self.on_shares_ready)
+
+        # The share scanner reads audio headers through the library's probe cache.
+        core.shares.audio_probe = self.song_processor.metadata_service.prober
         
         self.setup_soulseek_config()
         
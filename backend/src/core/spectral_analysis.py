@@ -0,0 +1,253 @@
+import io
+import json
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+# The track is analyzed in WINDOW_COUNT windows of WINDOW_SECONDS each,
+# spread evenly over its length; shorter tracks are analyzed whole. The
+# file is decoded BLOCK_FRAMES at a time and only the current window is
+# kept, so memory doesn't grow with the length or sample rate of the file.
+WINDOW_COUNT = 12
+WINDOW_SECONDS = 10.0
+BLOCK_FRAMES = 65536
+
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 256
+# STFT frames transformed at once; bounds the size of the intermediate arrays.
+STFT_BATCH_FRAMES = 256
+HIGH_BAND_HZ = 16000
+
+# The stored spectrogram: STFT bins are averaged into SPECTROGRAM_BINS bands
+# and every window's frames into at most SPECTROGRAM_COLUMNS_PER_WINDOW
+# columns, quantized to 8 bits over SPECTROGRAM_FLOOR_DB of dynamic range.
+SPECTROGRAM_BINS = 256
+SPECTROGRAM_COLUMNS_PER_WINDOW = 32
+SPECTROGRAM_FLOOR_DB = 120.0
+# High-band samples of both channels kept for the report, from one second
+# into the first window long enough.
+SNIPPET_OFFSET_SECONDS = 1.0
+SNIPPET_FRAMES = 2048
+
+
+def _window_bounds(total_frames, length, count):
+    """Yields (start, end) frames of the windows to analyze, in file order."""
+    if count < 2 or not total_frames or total_frames <= length * count:
+        start = 0
+        while True:
+            yield start, start + length
+            start += length
+    step = (total_frames - length) / (count - 1)
+    for index in range(count):
+        start = int(index * step)
+        yield start, start + length
+
+
+def _correlation(moments) -> Optional[float]:
+    n, sum_l, sum_r, sum_ll, sum_rr, sum_lr = (float(value) for value in moments)
+    if n < 2:
+        return None
+    denominator = ((n * sum_ll - sum_l ** 2) * (n * sum_rr - sum_r ** 2)) ** 0.5
+    if not denominator:
+        return None
+    return (n * sum_lr - sum_l * sum_r) / denominator
+
+
+@dataclass
+class SpectralAnalysis:
+    """
+    Spectral statistics of the analyzed windows of a file: everything the
+    Real/Fake verdict and the forensic report are computed from. It is
+    serializable, so it can be stored and a report drawn without decoding
+    the file again.
+    """
+    sample_rate: int
+    channels: int
+    duration: float  # decoded length of the whole file, in seconds
+    window_starts: Any  # (windows,) start of every analyzed window, in seconds
+    window_columns: Any  # (windows,) spectrogram columns of every window
+    mel_peak_power: Any  # (N_MELS,) peak power of every mel band, first channel
+    peak_db: Any  # (N_FFT // 2 + 1,) peak power of every STFT bin in dB, first channel
+    spectrogram: Any  # (SPECTROGRAM_BINS, columns) uint8, 0 = SPECTROGRAM_FLOOR_DB below the peak
+    hf_moments: Any  # (windows, 6) n, sum(l), sum(r), sum(l*l), sum(r*r), sum(l*r) above HIGH_BAND_HZ
+    hf_snippet: Any  # (2, SNIPPET_FRAMES) high band of both channels, or empty
+
+    @property
+    def is_stereo(self) -> bool:
+        return self.channels >= 2
+
+    def mel_frequencies(self):
+        import librosa
+        return librosa.mel_frequencies(n_mels=N_MELS, fmax=self.sample_rate / 2)
+
+    def bin_frequencies(self):
+        import numpy as np
+        return np.linspace(0, self.sample_rate / 2, N_FFT // 2 + 1, dtype=np.float32)
+
+    def spectrogram_db(self):
+        """The stored spectrogram in dB relative to its peak."""
+        import numpy as np
+        return self.spectrogram.astype(np.float32) * (SPECTROGRAM_FLOOR_DB / 255) - SPECTROGRAM_FLOOR_DB
+
+    def cutoff_frequency(self, dynamic_range_db: float) -> Optional[float]:
+        """Highest mel band frequency within `dynamic_range_db` of the loudest band, or None for no signal."""
+        import numpy as np
+        peak_db = 10 * np.log10(np.maximum(self.mel_peak_power, 1e-10))
+        significant_bins = np.where(peak_db > peak_db.max() - dynamic_range_db)[0]
+        if len(significant_bins) == 0:
+            return None
+        return float(self.mel_frequencies()[significant_bins[-1]])
+
+    def stereo_correlation(self) -> Optional[float]:
+        """Correlation of the high bands of both channels over all windows, or None if it wasn't measured."""
+        return _correlation(self.hf_moments.sum(axis=0)) if len(self.hf_moments) else None
+
+    def window_correlations(self) -> List[Optional[float]]:
+        return [_correlation(moments) for moments in self.hf_moments]
+
+    def to_bytes(self) -> bytes:
+        import numpy as np
+        buffer = io.BytesIO()
+        meta = json.dumps({'sample_rate': self.sample_rate, 'channels': self.channels, 'duration': self.duration})
+        np.savez_compressed(
+            buffer, meta=np.frombuffer(meta.encode('utf-8'), dtype=np.uint8),
+            window_starts=self.window_starts, window_columns=self.window_columns,
+            mel_peak_power=self.mel_peak_power, peak_db=self.peak_db, spectrogram=self.spectrogram,
+            hf_moments=self.hf_moments, hf_snippet=self.hf_snippet,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'SpectralAnalysis':
+        import numpy as np
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            meta = json.loads(arrays['meta'].tobytes().decode('utf-8'))
+            return cls(**meta, **{name: arrays[name] for name in arrays.files if name != 'meta'})
+
+
+class _SpectralAccumulator:
+    """
+    Accumulates the SpectralAnalysis statistics window by window. The STFT
+    runs in float32 in batches of frames; the high band of both channels
+    is filtered in one call.
+    """
+
+    def __init__(self, sr, channels):
+        import numpy as np
+        import librosa
+        from scipy import fft, signal
+
+        self.np = np
+        self.fft = fft
+        self.signal = signal
+        self.sr = sr
+        self.channels = channels
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=N_FFT, n_mels=N_MELS, fmax=sr / 2).T.astype(np.float32)
+        self.window = signal.get_window('hann', N_FFT, fftbins=True).astype(np.float32)
+        self.mel_peak_power = np.zeros(N_MELS, dtype=np.float32)
+        self.peak_power = np.zeros(N_FFT // 2 + 1, dtype=np.float32)
+        self.columns = []
+        self.window_starts = []
+        self.window_columns = []
+        self.high_band = None
+        if channels >= 2 and sr >= 44100:
+            self.high_band = signal.butter(4, HIGH_BAND_HZ / (sr / 2), btype='high', output='sos').astype(np.float32)
+        self.hf_moments = []
+        self.hf_snippet = np.zeros((0, SNIPPET_FRAMES), dtype=np.float32)
+
+    def add(self, samples, start, at_end):
+        """
+        Adds one window, shaped (frames, channels), that starts at frame
+        `start`; `at_end` tells whether it runs to the end of the file.
+        """
+        np = self.np
+        first = samples[:, 0]
+        # Like librosa.stft of the whole file, frames are centered and the
+        # signal zero-padded, but only at the file's own start and end.
+        # Inside the file only complete frames are taken: padding there
+        # would put a step at the window edge whose leakage reaches Nyquist
+        # and hides the cutoff of a transcode.
+        padded = np.pad(first, (N_FFT // 2 if start == 0 else 0, N_FFT // 2 if at_end else 0))
+        if len(padded) < N_FFT:
+            padded = np.pad(padded, (0, N_FFT - len(padded)))
+        frames = np.lib.stride_tricks.sliding_window_view(padded, N_FFT)[::HOP_LENGTH]
+        bands = np.empty((len(frames), SPECTROGRAM_BINS), dtype=np.float32)
+        for batch in range(0, len(frames), STFT_BATCH_FRAMES):
+            spectrum = self.fft.rfft(frames[batch:batch + STFT_BATCH_FRAMES] * self.window, axis=1)
+            power = spectrum.real ** 2 + spectrum.imag ** 2
+            np.maximum(self.mel_peak_power, (power @ self.mel_basis).max(axis=0), out=self.mel_peak_power)
+            np.maximum(self.peak_power, power.max(axis=0), out=self.peak_power)
+            bands[batch:batch + len(power)] = power[:, :N_FFT // 2].reshape(len(power), SPECTROGRAM_BINS, -1).mean(axis=2)
+
+        columns = min(SPECTROGRAM_COLUMNS_PER_WINDOW, len(frames))
+        edges = np.arange(columns) * len(frames) // columns
+        counts = np.diff(np.append(edges, len(frames)))[:, None]
+        self.columns.append(np.add.reduceat(bands, edges, axis=0) / counts)
+        self.window_starts.append(start / self.sr)
+        self.window_columns.append(columns)
+
+        if self.high_band is not None and len(samples) > 3 * (2 * len(self.high_band) + 1):
+            high = self.signal.sosfiltfilt(self.high_band, samples[:, :2], axis=0)
+            left, right = high[:, 0].astype(np.float64), high[:, 1].astype(np.float64)
+            self.hf_moments.append((len(left), left.sum(), right.sum(), left @ left, right @ right, left @ right))
+            offset = int(SNIPPET_OFFSET_SECONDS * self.sr)
+            if not len(self.hf_snippet) and len(high) >= offset + SNIPPET_FRAMES:
+                self.hf_snippet = np.ascontiguousarray(high[offset:offset + SNIPPET_FRAMES].T, dtype=np.float32)
+
+    def result(self, total_frames) -> SpectralAnalysis:
+        np = self.np
+        if self.columns:
+            columns = np.concatenate(self.columns).T
+            columns_db = 10 * np.log10(np.maximum(columns, 1e-10) / max(float(columns.max()), 1e-10))
+            spectrogram = np.round((np.clip(columns_db, -SPECTROGRAM_FLOOR_DB, 0) + SPECTROGRAM_FLOOR_DB)
+                                   * (255 / SPECTROGRAM_FLOOR_DB)).astype(np.uint8)
+        else:
+            spectrogram = np.zeros((SPECTROGRAM_BINS, 0), dtype=np.uint8)
+        peak_db = 10 * np.log10(np.maximum(self.peak_power, 1e-10))
+        return SpectralAnalysis(
+            sample_rate=self.sr,
+            channels=self.channels,
+            duration=total_frames / self.sr,
+            window_starts=np.array(self.window_starts, dtype=np.float32),
+            window_columns=np.array(self.window_columns, dtype=np.int32),
+            mel_peak_power=self.mel_peak_power,
+            peak_db=(peak_db - peak_db.max()).astype(np.float32),
+            spectrogram=spectrogram,
+            hf_moments=np.array(self.hf_moments, dtype=np.float64).reshape(-1, 6),
+            hf_snippet=self.hf_snippet,
+        )
+
+
+def analyze_spectrum(file_path, window_count=WINDOW_COUNT, window_seconds=WINDOW_SECONDS) -> SpectralAnalysis:
+    """
+    Decodes the whole file once, in blocks, and computes the spectral
+    statistics of the sampled windows. Raises on unreadable files.
+    """
+    # The analysis libraries take seconds to load, so they're imported on first use.
+    import numpy as np
+    import soundfile as sf
+
+    with sf.SoundFile(file_path) as audio:
+        sr = audio.samplerate
+        accumulator = _SpectralAccumulator(sr, audio.channels)
+        bounds = _window_bounds(audio.frames, int(window_seconds * sr), window_count)
+        current = next(bounds)
+        pieces = []
+        position = 0
+        for block in audio.blocks(blocksize=BLOCK_FRAMES, dtype='float32', always_2d=True):
+            block_start = position
+            position += len(block)
+            while current is not None and current[0] < position:
+                start, end = max(current[0], block_start), min(current[1], position)
+                if end > start:
+                    pieces.append(block[start - block_start:end - block_start])
+                if current[1] > position:
+                    break
+                accumulator.add(np.concatenate(pieces), current[0], current[1] >= audio.frames)
+                pieces = []
+                current = next(bounds, None)
+        if pieces:
+            accumulator.add(np.concatenate(pieces), current[0], True)
+
+    # The whole file is decoded, so a truncated stream shows up in the duration.
+    return accumulator.result(position)
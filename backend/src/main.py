@@ -1,22 +1,34 @@
+import time
+
+# Cold start is measured from here, before the imports below, which take most of it.
+PROCESS_STARTED = (time.time(), time.monotonic())
+
 import sys
+import multiprocessing
+
+if getattr(sys, 'frozen', False):
+    # Before anything else is imported, so worker processes of the frozen app start quickly.
+    multiprocessing.freeze_support()
+
 import logging
 import threading
-import time
-import multiprocessing
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-import glob
 
 from core.soulseek_manager import SoulseekManager
 from core.library_service import LibraryService
+from core.library_scanner import LibraryScanner
 from core.metadata_service import MetadataService
 from core.romanization_service import RomanizationService
 from core.song_processor import SongProcessor
 from core.playlist_service import PlaylistService
-from api import search_routes, download_routes, library_routes, system_routes, playlist_routes
+from core.job_manager import JobManager
+from api import search_routes, download_routes, library_routes, system_routes, playlist_routes, job_routes
 from api.search_routes import router as search_router
 from core.config_utils import get_config_path, get_documents_folder
+from core.readiness import readiness
+from utils.warmup import warm_up, timed_import
 
 import os
 import json
@@ -49,11 +61,12 @@ def load_data_path():
     return None
 
 if getattr(sys, 'frozen', False):
-    multiprocessing.freeze_support()
     application_path = os.path.dirname(sys.executable)
 else:
     application_path = os.path.dirname(os.path.abspath(__file__))
 
+readiness.set_started(*PROCESS_STARTED)
+readiness.start('config_loaded')
 data_path = load_data_path()
 if data_path is None:
     # This fallback is now less likely to be used, but kept for safety.
@@ -103,6 +116,7 @@ pynicotine_config.load_config(isolated_mode=True)
 pynicotine_config.sections["server"]["login"] = misc_config['credentials']['username']
 pynicotine_config.sections["server"]["passw"] = misc_config['credentials']['password']
 pynicotine_config.write_configuration()
+readiness.finish('config_loaded')
 
 app = FastAPI(title="Sonosano API", version="1.0.0")
 
@@ -114,21 +128,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+readiness.start('database_open')
 metadata_service = MetadataService(data_path)
 library_service = LibraryService(metadata_service, data_path)
-romanization_service = RomanizationService()
+readiness.finish('database_open')
+library_scanner = LibraryScanner(library_service)
+romanization_service = RomanizationService(data_path)
 song_processor = SongProcessor(library_service, metadata_service, romanization_service, data_path)
-soulseek_manager = SoulseekManager(library_service, data_path)
+soulseek_manager = SoulseekManager(library_service, song_processor, data_path)
 playlist_service = PlaylistService(data_path)
+job_manager = JobManager()
 
 search_routes.soulseek_manager = soulseek_manager
 download_routes.soulseek_manager = soulseek_manager
 library_routes.library_service = library_service
+library_routes.library_scanner = library_scanner
 playlist_routes.library_service = library_service
 playlist_routes.playlist_service = playlist_service
 library_routes.song_processor = song_processor
+library_routes.job_manager = job_manager
+job_routes.job_manager = job_manager
 system_routes.soulseek_manager = soulseek_manager
 system_routes.romanization_service = romanization_service
+system_routes.cover_store = metadata_service.cover_store
 system_routes.data_path = data_path
 
 app.include_router(search_router, prefix="", tags=["search"])
@@ -136,6 +158,7 @@ app.include_router(download_routes.router, prefix="", tags=["download"])
 app.include_router(library_routes.router, prefix="", tags=["library"])
 app.include_router(system_routes.router, prefix="", tags=["system"])
 app.include_router(playlist_routes.router, prefix="", tags=["playlists"])
+app.include_router(job_routes.router, prefix="", tags=["jobs"])
 
 covers_path = os.path.join(data_path, "covers")
 os.makedirs(covers_path, exist_ok=True)
@@ -149,6 +172,7 @@ from watchdog.observers import Observer
 from core.file_watcher import MusicFileHandler
 
 def long_running_startup_tasks():
+    readiness.start('soulseek_connected')
     soulseek_manager.initialize_soulseek()
     event_thread = threading.Thread(target=soulseek_manager.process_events, daemon=True)
     event_thread.start()
@@ -157,57 +181,61 @@ def long_running_startup_tasks():
         logging.info("Waiting for Soulseek login before initial sync...")
         if not soulseek_manager.login_event.wait(timeout=60):
             logging.warning("Soulseek login timed out. Initial sync may be incomplete.")
+            readiness.finish('initial_sync', error="Soulseek login timed out")
             return
             
         logging.info("=== Starting initial library sync and processing ===")
-        all_songs_in_db = {s['path'] for s in library_service.get_all_songs()}
-        music_directory = pynicotine_config.sections["transfers"]["downloaddir"]
-        logging.info(f"Scanning music directory for sync: {music_directory}")
-        
-        fs_files = set()
-        for ext in {'.mp3', '.wav', '.flac', '.m4a', '.aac', '.ogg', '.wma', '.opus'}:
-            # Use relative paths for comparison
-            for file_path in glob.glob(os.path.join(music_directory, f"**/*{ext}"), recursive=True):
-                fs_files.add(os.path.relpath(file_path, music_directory))
-
-        new_files = fs_files - all_songs_in_db
-        deleted_files = all_songs_in_db - fs_files
-        logging.info(f"Sync found {len(new_files)} new files and {len(deleted_files)} deleted files.")
-
-        for file_path in deleted_files:
-            logging.info(f"Sync: Removing deleted song from DB: {file_path}")
-            library_service.remove_song(file_path)
-
-        logging.info(f"Processing {len(new_files)} new files for metadata, covers, and lyrics.")
-        for file_path in new_files:
-            if file_path not in song_processor._currently_processing:
-                # Reconstruct the absolute path for the song processor
-                abs_path = os.path.join(music_directory, file_path)
-                song_processor.process_new_song(abs_path)
-        logging.info("=== Initial library sync and processing finished. ===")
+        readiness.start('initial_sync')
+        # Runs as a regular sync job, so a /library/sync request meanwhile attaches to it.
+        job, _ = library_routes.start_library_sync()
+        job.wait()
+        # A cancelled sync has no error, but the library wasn't synced either.
+        readiness.finish('initial_sync', error=(job.error or f"Sync {job.status}") if job.status != 'done' else None)
+        logging.info(f"=== Initial library sync and processing finished: {job.status} {job.result or ''} ===")
 
     sync_thread = threading.Thread(target=initial_sync, daemon=True)
     sync_thread.start()
 
     def start_watcher():
+        readiness.start('watcher_live')
         music_directory = pynicotine_config.sections["transfers"]["downloaddir"]
         event_handler = MusicFileHandler(library_service, song_processor, music_directory)
         observer = Observer()
         observer.schedule(event_handler, music_directory, recursive=True)
-        observer.start()
+        event_handler.start()
+        try:
+            observer.start()
+        except Exception as e:
+            logging.error(f"Could not watch {music_directory}: {e}")
+            event_handler.stop()
+            readiness.finish('watcher_live', error=str(e))
+            return
+        readiness.finish('watcher_live')
         try:
             while True: time.sleep(1)
         except KeyboardInterrupt:
             observer.stop()
+            event_handler.stop()
         observer.join()
 
     watcher_thread = threading.Thread(target=start_watcher, daemon=True)
     watcher_thread.start()
 
+# Seconds after startup before the heavy libraries are loaded in the background.
+WARM_UP_DELAY = 1.0
+
 @app.on_event("startup")
 async def startup_event():
     startup_thread = threading.Thread(target=long_running_startup_tasks, daemon=True)
     startup_thread.start()
+    # Loaded lazily; warming them up spares the first song, search and analysis the wait.
+    warm_up([
+        ('uroman', romanization_service.warm_up),
+        ('bs4', lambda: timed_import('bs4')),
+        ('numpy', lambda: timed_import('numpy')),
+        ('scipy.signal', lambda: timed_import('scipy.signal')),
+        ('librosa', lambda: timed_import('librosa')),
+    ], delay=WARM_UP_DELAY)
 
 def main():
     import uvicorn
@@ -461,6 +461,7 @@ class Downloads(Transfers):
             return
 
         core.statistics.append_stat_value("completed_downloads", 1)
+        events.emit("file-download-finished", transfer, download_file_path)
 
         # Attempt to show notification and execute commands
         self._file_downloaded_actions(username, download_file_path)
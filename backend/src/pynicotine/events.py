@@ -156,6 +156,7 @@ EVENT_NAMES = {
     "download-file-error",
     "download-large-folder",
     "file-connection-closed",
+    "file-download-finished",
     "file-download-progress",
     "file-transfer-init",
     "file-upload-progress",
@@ -242,12 +242,12 @@ class Scanner:
                  "rescan", "rebuild", "reveal_buddy_shares", "reveal_trusted_shares",
                  "files", "streams", "mtimes", "word_index", "processed_share_names",
                  "processed_share_paths", "current_file_index", "current_folder_count",
-                 "lowercase_paths")
+                 "lowercase_paths", "audio_probe")
 
     HIDDEN_FOLDER_NAMES = {"@eaDir", "#recycle", "#snapshot"}
 
     def __init__(self, writer, share_groups, share_db_paths, init=False, rescan=True,
-                 rebuild=False, reveal_buddy_shares=False, reveal_trusted_shares=False):
+                 rebuild=False, reveal_buddy_shares=False, reveal_trusted_shares=False, audio_probe=None):
 
         self.writer = writer
         self.share_groups = share_groups
@@ -267,6 +267,7 @@ class Scanner:
         self.processed_share_paths = set()
         self.current_file_index = 0
         self.current_folder_count = 0
+        self.audio_probe = audio_probe
 
     def run(self):
 
@@ -609,6 +610,13 @@ class Scanner:
 
     def get_audio_tag(self, file_path, size):
 
+        if self.audio_probe is not None:
+            # Reuse the application's cached header probe when it has one
+            tag = self.audio_probe.share_tag(file_path, size)
+
+            if tag is not None:
+                return tag
+
         parser_class = TinyTag._get_parser_for_filename(file_path)  # pylint: disable=protected-access
 
         if parser_class is None:
@@ -692,13 +700,14 @@ class Scanner:
 
 class Shares:
     __slots__ = ("share_dbs", "requested_share_times", "initialized", "rescanning", "compressed_shares",
-                 "share_db_paths", "file_path_index", "_scanner_process", "_rescan_daily_timer_id")
+                 "share_db_paths", "file_path_index", "_scanner_process", "_rescan_daily_timer_id", "audio_probe")
 
     BACKSLASH_SENTINEL = "@@BACKSLASH@@"
 
     def __init__(self):
 
         self.share_dbs = {}
+        self.audio_probe = None
         self.requested_share_times = {}
         self.initialized = False
         self.rescanning = False
@@ -1151,7 +1160,8 @@ class Shares:
             rescan,
             rebuild,
             reveal_buddy_shares=config.sections["transfers"]["reveal_buddy_shares"],
-            reveal_trusted_shares=config.sections["transfers"]["reveal_trusted_shares"]
+            reveal_trusted_shares=config.sections["transfers"]["reveal_trusted_shares"],
+            audio_probe=self.audio_probe
         )
         scanner = context.Process(target=scanner_obj.run, daemon=True)
         return scanner, reader
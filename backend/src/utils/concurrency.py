@@ -0,0 +1,39 @@
+import functools
+from typing import Any, Callable, Dict, TypeVar
+
+import anyio
+import anyio.to_thread
+
+T = TypeVar('T')
+
+# Maximum number of worker threads each kind of blocking work may occupy at
+# once. Every kind gets its own limiter, so a burst of searches can't use up
+# the threads other routes need. Operations that outlive a request run as
+# jobs instead, see core.job_manager.
+THREAD_LIMITS: Dict[str, int] = {
+    'library_io': 8,
+    'search': 8,
+    'soulseek_search': 4,
+    'playlist_thumbnail': 4,
+    'romanize': 2,
+    'forensics': 2,
+    'system': 4,
+}
+
+_limiters: Dict[str, anyio.CapacityLimiter] = {}
+
+
+def _limiter(kind: str) -> anyio.CapacityLimiter:
+    # Created on first use, from inside the event loop.
+    limiter = _limiters.get(kind)
+    if limiter is None:
+        limiter = _limiters[kind] = anyio.CapacityLimiter(THREAD_LIMITS[kind])
+    return limiter
+
+
+async def run_blocking(kind: str, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Runs a blocking function in a worker thread so the event loop stays free,
+    waiting for a free slot of its kind first.
+    """
+    return await anyio.to_thread.run_sync(functools.partial(func, *args, **kwargs), limiter=_limiter(kind))
@@ -1,10 +1,11 @@
 import os
 import json
 
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.m4a', '.aac', '.ogg', '.wma', '.opus')
+
 def is_audio_file(path, ext):
     """Checks if a file is an audio file based on its extension."""
-    audio_extensions = {'.mp3', '.wav', '.flac', '.m4a', '.aac', '.ogg', '.wma', '.opus'}
-    return ext in audio_extensions or any(path.lower().endswith(audio_ext) for audio_ext in audio_extensions)
+    return ext in AUDIO_EXTENSIONS or path.lower().endswith(AUDIO_EXTENSIONS)
 
 def load_or_create_misc_config():
     """Loads or creates the misc config file."""
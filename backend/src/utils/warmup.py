@@ -0,0 +1,58 @@
+import sys
+import time
+import logging
+import importlib
+import threading
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+# Seconds each warm-up step took, in the order they finished.
+_timings: Dict[str, float] = {}
+_timings_lock = threading.Lock()
+
+
+def timed_import(name: str):
+    """Imports a module, recording how long it took if it wasn't loaded yet."""
+    loaded = name in sys.modules
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    if not loaded:
+        _record(name, time.perf_counter() - started)
+    return module
+
+
+def warm_up_timings() -> Dict[str, float]:
+    with _timings_lock:
+        return dict(_timings)
+
+
+def _record(name: str, seconds: float):
+    with _timings_lock:
+        _timings.setdefault(name, round(seconds, 3))
+
+
+def warm_up(steps: Iterable[Tuple[str, Callable[[], Any]]], delay: float = 0.0) -> threading.Thread:
+    """
+    Runs slow initialisation steps in a background thread, so the API can
+    answer right away and the first request that needs them doesn't pay for
+    them. Logs how long each step took.
+    """
+    steps = list(steps)
+
+    def run():
+        if delay:
+            time.sleep(delay)
+        started = time.perf_counter()
+        for name, step in steps:
+            step_started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                logging.warning(f"Warm-up of {name} failed: {e}")
+                continue
+            _record(name, time.perf_counter() - step_started)
+        breakdown = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in warm_up_timings().items())
+        logging.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s ({breakdown})")
+
+    thread = threading.Thread(target=run, name='warm-up', daemon=True)
+    thread.start()
+    return thread